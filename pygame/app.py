@@ -11,8 +11,12 @@ from pygame_gui import UIManager
 from interface.cartesian_plane import Cartesian_plane
 from interface.header import Header
 from interface.user import User
+from interface.broadcast import SceneBroadcaster, SceneReceiver
+from interface.export import SceneExporter
 from config import *
 from camera.face_detector import StressLevelDetector
+from camera.telemetry import TelemetryRecorder, EVENT_PRESS, EVENT_RELEASE, EVENT_DRAG, EVENT_NEW_FIGURE, \
+    EVENT_HOVER
 
 class App:
     def __init__(self):
@@ -27,17 +31,34 @@ class App:
         self.header = Header(HEADER_SIZE, COLOR_HEADER, self.font, self.screen)
         self.grid = Cartesian_plane(self.screen, self.header, self.font)
 
+        self.exporter = SceneExporter(self.grid)
+        self.keys_pressed = set()
+        self.editing_function = None  # function graph whose expression is being typed
+
+        self.broadcaster = None
+        self.receiver = None
+        if BROADCAST_ROLE == "teacher":
+            self.broadcaster = SceneBroadcaster()
+            self.grid.listeners.append(self.broadcaster)
+        elif BROADCAST_ROLE == "student":
+            self.receiver = SceneReceiver()
+
         self.running = True
         self.moving = False
 
+        # The detector must exist before the camera thread uses it
+        self.stress_detector = StressLevelDetector()
+        self.stress_level = ""
+
+        self.telemetry = TelemetryRecorder(self.stress_detector)
+        self.mouse_pressed = False
+        self.hovered_figure = None
+
         # Add the stop event for the camera thread
         self.stop_event = threading.Event()
         self.camera_thread = threading.Thread(target=self.camera_recording_and_saving, args=(self.stop_event,))
         self.camera_thread.start()
 
-        self.stress_detector = StressLevelDetector()
-        self.stress_level = ""
-
     def camera_recording_and_saving(self, stop_event):
         # Initialize the camera (0 is usually the default camera)
         cap = cv2.VideoCapture(0)
@@ -50,6 +71,84 @@ class App:
             time.sleep(CAPTURE_TIME)  # Adjust this based on your desired frame rate
         cap.release()
 
+    def record_telemetry(self):
+        user = self.user
+        if user.mouse_button_pressed != self.mouse_pressed:
+            self.mouse_pressed = user.mouse_button_pressed
+            self.telemetry.record(EVENT_PRESS if self.mouse_pressed else EVENT_RELEASE, user.mouse_pos)
+
+        # The release can clear the selection after self.moving was computed this frame
+        if self.moving and user.mouse_motion and self.grid.selected_figure is not None:
+            self.telemetry.record(EVENT_DRAG, user.mouse_pos, self.grid.selected_figure.id)
+
+        if self.grid.hovered_figure is not self.hovered_figure:
+            self.hovered_figure = self.grid.hovered_figure
+            figure = -1 if self.hovered_figure is None else self.hovered_figure.id
+            self.telemetry.record(EVENT_HOVER, user.mouse_pos, figure)
+
+    def check_keys(self):
+        keys = set(self.user.keys_pressed)
+        new_keys = keys - self.keys_pressed
+        self.keys_pressed = keys
+
+        if self.header.is_typing():
+            return  # keys go to the expression entry
+
+        ctrl = pygame.K_LCTRL in keys or pygame.K_RCTRL in keys
+        shift = pygame.K_LSHIFT in keys or pygame.K_RSHIFT in keys
+
+        if ctrl and pygame.K_z in new_keys:
+            if shift:
+                self.grid.history.redo()
+            else:
+                self.grid.history.undo()
+        elif ctrl and pygame.K_y in new_keys:
+            self.grid.history.redo()
+        elif pygame.K_DELETE in new_keys or pygame.K_BACKSPACE in new_keys:
+            self.grid.delete_selected()
+        elif pygame.K_e in new_keys:
+            self.exporter.export("png")
+        elif pygame.K_s in new_keys:
+            self.exporter.export("svg")
+        # Measurements over the last selected figures
+        elif pygame.K_d in new_keys:
+            self.grid.measurements.measure("distance")
+        elif pygame.K_m in new_keys:
+            self.grid.measurements.measure("midpoint")
+        elif pygame.K_a in new_keys:
+            self.grid.measurements.measure("angle")
+        elif pygame.K_l in new_keys:
+            self.grid.measurements.measure("slope")
+        elif pygame.K_f in new_keys:
+            figure = self.grid.hovered_figure
+            if figure is not None and figure.kind == "function":
+                self.edit_expression(figure)
+
+        if self.moving and self.grid.selected_figure is None:
+            # Delete or undo removed the dragged figure
+            self.moving = False
+            self.grid.history.end_move()
+
+    def edit_expression(self, figure):
+        self.editing_function = figure
+        self.header.deploy_expression(figure.expression)
+
+    def check_expression(self):
+        figure = self.editing_function
+        if figure is None or self.user.text_entered is None:
+            return
+        if self.grid.figures_by_id.get(figure.id) is not figure:
+            # Deleted while typing
+            self.header.close_expression()
+            self.editing_function = None
+            return
+        error = self.grid.set_expression(figure, self.user.text_entered)
+        if error:
+            self.header.expression_error(error)
+        else:
+            self.header.close_expression()
+            self.editing_function = None
+
     def run(self):
         while self.running:
             time_delta = self.clock.tick(60) / 1000.0
@@ -57,6 +156,8 @@ class App:
             if self.moving:
                 self.grid.move_figure(pos=self.user.mouse_pos)
             self.running = self.user.process_events()
+            self.check_keys()
+            self.check_expression()
 
             mouse_pos = None
 
@@ -65,6 +166,9 @@ class App:
             if not self.header.is_mouse_inside(self.user.mouse_pos):
                 if self.header.selected_button != "" and self.user.mouse_button_pressed:
                     self.grid.new_figure(self.user, self.header.selected_button)
+                    self.telemetry.record(EVENT_NEW_FIGURE, self.user.mouse_pos, self.grid.next_id - 1)
+                    if self.header.selected_button == "function":
+                        self.edit_expression(self.grid.figures_by_id[self.grid.next_id - 1])
                     self.header.clear_buttons_state()
                 else:
                     mouse_pos = self.grid.run(self.user)
@@ -72,6 +176,13 @@ class App:
             else:
                 header_text = self.header.selected_button
 
+            self.record_telemetry()
+
+            if self.broadcaster:
+                self.broadcaster.flush(self.grid.figures)
+            if self.receiver:
+                self.receiver.apply(self.grid)
+
             self.screen.fill(COLOR_BACKGROUND)
 
             self.grid.draw(mouse_pos)
@@ -83,6 +194,11 @@ class App:
 
         self.stop_event.set()
         self.camera_thread.join()
+        self.telemetry.close()
+        if self.broadcaster:
+            self.broadcaster.close()
+        if self.receiver:
+            self.receiver.close()
         pygame.quit()
 
         exit()
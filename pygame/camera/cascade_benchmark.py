@@ -0,0 +1,147 @@
+"""
+Replays recorded sessions (frames/<session>/) over a grid of Haar cascade
+settings and reports throughput, latency and agreement with a reference run
+(the settings the detector used to hard-code: 1.1, 4, no minimum size, full
+resolution). Settings on the Pareto front of throughput and agreement are
+marked, and --write-config saves the fastest one that still agrees enough.
+
+Run from the pygame folder:
+    python -m camera.cascade_benchmark frames/<session> --input-scales 1 0.5
+
+Without sessions it uses every session the detector recorded. Frames are read
+from disk again for each setting, so memory does not grow with the sessions.
+"""
+
+import argparse
+import itertools
+import re
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from camera.face_detector import StressLevelDetector, SESSIONS_FOLDER
+
+REFERENCE = (1.1, 4, 0, 1.0)
+CONFIG_NAMES = ["CASCADE_SCALE_FACTOR", "CASCADE_MIN_NEIGHBORS", "CASCADE_MIN_SIZE", "CASCADE_INPUT_SCALE"]
+
+
+def frame_paths(folders):
+    paths = []
+    for folder in folders:
+        paths.extend(sorted(Path(folder).glob("*.jpg"), key=lambda p: int(p.stem)))
+    return paths
+
+
+def read_frames(paths):
+    for path in paths:
+        yield cv2.cvtColor(cv2.imread(str(path)), cv2.COLOR_BGR2GRAY)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter)
+
+
+def match(faces, reference, threshold=0.5):
+    """Greedy IoU matching, returns true positives, false positives and false negatives."""
+    unmatched = list(reference)
+    tp = 0
+    for face in faces:
+        scores = [iou(face, r) for r in unmatched]
+        if scores and max(scores) >= threshold:
+            unmatched.pop(int(np.argmax(scores)))
+            tp += 1
+    return tp, len(faces) - tp, len(unmatched)
+
+
+def run(paths, setting, repeat):
+    scale_factor, min_neighbors, min_size, input_scale = setting
+    detector = StressLevelDetector(save_frame=False, motion_gate=False, scale_factor=scale_factor,
+                                   min_neighbors=min_neighbors, min_size=min_size, input_scale=input_scale)
+    latencies = []
+    detections = []
+    for gray in read_frames(paths):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            faces = detector.detect(gray)
+            latencies.append(time.perf_counter() - start)
+        detections.append([tuple(f) for f in faces])
+    return np.array(latencies), detections
+
+
+def pareto(results):
+    front = set()
+    for n, a in enumerate(results):
+        dominated = any(b["fps"] >= a["fps"] and b["f1"] >= a["f1"] and (b["fps"] > a["fps"] or b["f1"] > a["f1"])
+                        for b in results)
+        if not dominated:
+            front.add(n)
+    return front
+
+
+def write_config(setting, path="config.py"):
+    text = Path(path).read_text()
+    for name, value in zip(CONFIG_NAMES, setting):
+        text = re.sub(rf"^{name} = [^#\n]*?(\s*#|$)", rf"{name} = {value!r}\1", text, flags=re.MULTILINE)
+    Path(path).write_text(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Haar cascade parameter sweep on recorded sessions")
+    parser.add_argument("sessions", nargs="*",
+                        help=f"{SESSIONS_FOLDER}/<session> folders, every recorded session by default")
+    parser.add_argument("--scale-factors", type=float, nargs="+", default=[1.05, 1.1, 1.2, 1.3])
+    parser.add_argument("--min-neighbors", type=int, nargs="+", default=[3, 4, 5])
+    parser.add_argument("--min-sizes", type=int, nargs="+", default=[0, 40, 80])
+    parser.add_argument("--input-scales", type=float, nargs="+", default=[1.0, 0.75, 0.5])
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per frame")
+    parser.add_argument("--min-agreement", type=float, default=0.9, help="F1 against the reference run")
+    parser.add_argument("--write-config", action="store_true", help="save the recommended setting in config.py")
+    args = parser.parse_args()
+
+    sessions = args.sessions
+    if not sessions and Path(SESSIONS_FOLDER).is_dir():
+        sessions = sorted(str(p) for p in Path(SESSIONS_FOLDER).iterdir() if p.is_dir())
+    paths = frame_paths(sessions)
+    if not paths:
+        print(f"no recorded frames found in {', '.join(sessions) or SESSIONS_FOLDER}")
+        raise SystemExit(1)
+    print(f"{len(paths)} frames from {len(sessions)} sessions")
+
+    _, reference = run(paths, REFERENCE, 1)
+
+    results = []
+    grid = itertools.product(args.scale_factors, args.min_neighbors, args.min_sizes, args.input_scales)
+    for setting in grid:
+        latencies, detections = run(paths, setting, args.repeat)
+        tp, fp, fn = np.sum([match(d, r) for d, r in zip(detections, reference)], axis=0)
+        results.append({"setting": setting,
+                        "fps": len(latencies) / latencies.sum(),
+                        "p50": np.percentile(latencies, 50) * 1000,
+                        "p95": np.percentile(latencies, 95) * 1000,
+                        "f1": 1.0 if tp + fp + fn == 0 else 2 * tp / (2 * tp + fp + fn)})
+
+    front = pareto(results)
+    print(f"{'scale':>6} {'neigh':>5} {'min':>4} {'input':>5} {'fps':>8} {'p50 ms':>7} {'p95 ms':>7} {'f1':>5}")
+    for n, r in sorted(enumerate(results), key=lambda item: -item[1]["fps"]):
+        scale_factor, min_neighbors, min_size, input_scale = r["setting"]
+        print(f"{scale_factor:>6} {min_neighbors:>5} {min_size:>4} {input_scale:>5} {r['fps']:>8.1f} "
+              f"{r['p50']:>7.1f} {r['p95']:>7.1f} {r['f1']:>5.2f}{' *' if n in front else ''}")
+
+    candidates = [results[n] for n in front if results[n]["f1"] >= args.min_agreement]
+    if not candidates:
+        print(f"no setting reaches an agreement of {args.min_agreement}")
+    else:
+        best = max(candidates, key=lambda r: r["fps"])
+        print("recommended:", dict(zip(CONFIG_NAMES, best["setting"])))
+        if args.write_config:
+            write_config(best["setting"])
+            print("saved in config.py")
@@ -0,0 +1,211 @@
+"""
+Headless stress detection for a whole classroom.
+
+Every stream keeps only its latest frame and is queued or held by a worker at
+most once, so the shared detector pool serves streams round robin and a slow
+stream can never build up a backlog. A frame is dropped instead of processed
+late when its age plus the stream's recent detection time would exceed
+max_latency. That is a target, not a hard bound: a detection slower than the
+recent average still finishes late and shows up in latency_ms.
+
+Run from the pygame folder:
+    python -m camera.classroom_service 0 1 ../frames/101520250021 lesson.mp4
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import cv2
+
+from config import SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_MAX_LATENCY, CAPTURE_TIME
+from camera.face_detector import StressLevelDetector, MotionGate, STRESS_STATES, next_stress
+
+
+class FrameStream:
+    """
+    A camera index, a video file or a recorded session folder (frames/<session>/).
+    """
+
+    def __init__(self, name, source, interval=CAPTURE_TIME):
+        self.name = name
+        self.source = source
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.frame = None
+        self.frame_time = None
+        self.queued = False
+
+        self.stress = 1
+        self.faces = []
+        self.motion_gate = MotionGate()
+        self.latency = None
+        self.detect_time = 0  # moving average of the detection time, only the worker holding the stream writes it
+        self.processed = 0
+        self.unchanged = 0
+        self.dropped = 0
+        self.finished = False
+
+    def frames(self, stop_event):
+        if Path(str(self.source)).is_dir():
+            paths = sorted(Path(self.source).glob("*.jpg"), key=lambda p: int(p.stem))
+            for path in paths:
+                if stop_event.is_set():
+                    return
+                yield cv2.imread(str(path))
+                time.sleep(self.interval)
+        else:
+            cap = cv2.VideoCapture(self.source)
+            is_file = not isinstance(self.source, int)
+            while not stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+                if is_file:
+                    time.sleep(self.interval)
+            cap.release()
+
+    def read(self, stop_event, on_frame):
+        for frame in self.frames(stop_event):
+            with self.lock:
+                if self.frame is not None:
+                    self.dropped += 1
+                self.frame = frame
+                self.frame_time = time.monotonic()
+            on_frame(self)
+        self.finished = True
+
+    def take(self):
+        with self.lock:
+            frame, frame_time = self.frame, self.frame_time
+            self.frame = None
+        return frame, frame_time
+
+    def release(self, ready):
+        # A stream stays queued while a worker holds it, so it is never processed twice at once
+        with self.lock:
+            self.queued = self.frame is not None
+        if self.queued:
+            ready.put(self)
+
+    def status(self):
+        return {"stress": STRESS_STATES[self.stress],
+                "stress_level": self.stress,
+                "faces": len(self.faces),
+                "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+                "processed": self.processed,
+                "unchanged": self.unchanged,
+                "dropped": self.dropped,
+                "finished": self.finished}
+
+
+class ClassroomService:
+    def __init__(self, streams, workers=SERVICE_WORKERS, max_latency=SERVICE_MAX_LATENCY):
+        self.streams = streams
+        self.max_latency = max_latency
+        self.ready = queue.Queue()
+        # Motion gating is per stream, the pooled detectors see every stream
+        self.detectors = [StressLevelDetector(save_frame=False, motion_gate=False) for _ in range(workers)]
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def on_frame(self, stream):
+        with stream.lock:
+            if stream.queued:
+                return
+            stream.queued = True
+        self.ready.put(stream)
+
+    def work(self, detector):
+        while not self.stop_event.is_set():
+            try:
+                stream = self.ready.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            frame, frame_time = stream.take()
+            if frame is not None:
+                if time.monotonic() - frame_time + stream.detect_time > self.max_latency:
+                    with stream.lock:
+                        stream.dropped += 1
+                else:
+                    if stream.motion_gate.changed(frame):
+                        start = time.monotonic()
+                        _, stream.faces = detector.process_frame(frame)
+                        stream.detect_time = 0.8 * stream.detect_time + 0.2 * (time.monotonic() - start)
+                        stream.processed += 1
+                    else:
+                        stream.unchanged += 1
+                    stream.stress = next_stress(stream.stress)
+                    stream.latency = time.monotonic() - frame_time
+            stream.release(self.ready)
+
+    def status(self):
+        return {stream.name: stream.status() for stream in self.streams}
+
+    def start(self):
+        for stream in self.streams:
+            self.threads.append(threading.Thread(target=stream.read, args=(self.stop_event, self.on_frame),
+                                                 daemon=True))
+        for detector in self.detectors:
+            self.threads.append(threading.Thread(target=self.work, args=(detector,), daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(service.status()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        print(f"serving stress levels on http://{host}:{port}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stop()
+
+
+def parse_source(source):
+    return int(source) if source.isdigit() else source
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classroom stress detection service")
+    parser.add_argument("sources", nargs="+",
+                        help="camera indexes, video files or recorded frames/<session> folders")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--max-latency", type=float, default=SERVICE_MAX_LATENCY)
+    parser.add_argument("--interval", type=float, default=CAPTURE_TIME,
+                        help="seconds between frames of recorded sources")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    streams = [FrameStream(f"student_{n}", parse_source(source), args.interval)
+               for n, source in enumerate(args.sources)]
+    service = ClassroomService(streams, args.workers, args.max_latency)
+    service.start()
+    service.serve(args.host, args.port)
@@ -1,16 +1,75 @@
 import os
+import time
 from pathlib import Path
 import cv2
 import numpy as np
 
 from datetime import datetime
 
+from config import MOTION_SIZE, MOTION_THRESHOLD, MOTION_MAX_SKIP, CASCADE_SCALE_FACTOR, CASCADE_MIN_NEIGHBORS, \
+    CASCADE_MIN_SIZE, CASCADE_INPUT_SCALE
+
+SESSIONS_FOLDER = "frames"  # recorded frames go to <folder>/<session>/<frame index>.jpg
+
+STRESS_STATES = ["Totalmente relajado",
+                 "Relajado",
+                 "Neutro",
+                 "Medianamente estresado",
+                 "Muy estresado"
+                 ]
+
+
+def next_stress(stress):
+    coin = np.random.rand()
+    if coin < 0.05:
+        stress = max(0, stress - 1)
+    elif coin > 0.9:
+        stress = min(stress + 1, len(STRESS_STATES) - 1)
+    return stress
+
+
+class MotionGate:
+    """
+    Cheap change detector: mean absolute difference between small grayscale
+    versions of the frame and of the last frame that went through detection.
+    """
+
+    def __init__(self, size=MOTION_SIZE, threshold=MOTION_THRESHOLD, max_skip=MOTION_MAX_SKIP):
+        self.size = size
+        self.threshold = threshold
+        self.max_skip = max_skip  # unchanged frames before detection runs anyway
+        self.reference = None
+        self.skipped = 0
+        self.difference = None
+
+    def changed(self, img):
+        small = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), self.size, interpolation=cv2.INTER_AREA)
+        if self.reference is not None and self.skipped < self.max_skip:
+            self.difference = cv2.absdiff(small, self.reference).mean()
+            if self.difference < self.threshold:
+                self.skipped += 1
+                return False
+        self.reference = small
+        self.skipped = 0
+        return True
+
+
 class StressLevelDetector:
-    def __init__(self, save_frame = True):
+    def __init__(self, save_frame = True, motion_gate = True,
+                 scale_factor = CASCADE_SCALE_FACTOR,
+                 min_neighbors = CASCADE_MIN_NEIGHBORS,
+                 min_size = CASCADE_MIN_SIZE,
+                 input_scale = CASCADE_INPUT_SCALE):
         self.face_cascade = cv2.CascadeClassifier(
             'camera/haarcascade_frontalface_default.xml')
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size  # pixels of the original frame
+        self.input_scale = input_scale
         self.stress = 1
         self.frame = None
+        self.faces = []
+        self.motion_gate = MotionGate() if motion_gate else None
 
         self.save_frame = save_frame
         self.init_time = datetime.now().strftime("%m%d%Y%H%M")
@@ -18,36 +77,36 @@ class StressLevelDetector:
 
             Path(f"output/{self.init_time}").mkdir(
                 parents=True, exist_ok=True)
-            Path(f"frames/{self.init_time}").mkdir(
+            Path(f"{SESSIONS_FOLDER}/{self.init_time}").mkdir(
                 parents=True, exist_ok=True)
 
 
         self.img_count = 0
-
+        # Index and monotonic time (ns) of the last captured frame
+        self.frame_index = -1
+        self.frame_time = None
 
     def get_stress_level(self):
-        coin = np.random.rand()
-        if coin < 0.05:
-            self.stress = max(0, self.stress - 1)
-        elif coin > 0.9:
-            self.stress = min(self.stress + 1, 4)
-
-        print(coin, self.stress)
-
-        states = ["Totalmente relajado",
-                  "Relajado",
-                  "Neutro",
-                  "Medianamente estresado",
-                  "Muy estresado"
-                  ]
-        return states[self.stress]
+        self.stress = next_stress(self.stress)
+        print(self.stress)
+        return STRESS_STATES[self.stress]
+
+    def detect(self, gray):
+        if self.input_scale != 1:
+            gray = cv2.resize(gray, None, fx=self.input_scale, fy=self.input_scale, interpolation=cv2.INTER_AREA)
+        min_size = int(self.min_size * self.input_scale)
+        faces = self.face_cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                                   minSize=(min_size, min_size))
+        if self.input_scale != 1 and len(faces):
+            faces = np.round(np.asarray(faces) / self.input_scale).astype(int)
+        return faces
 
     def process_frame(self, img=None, show=False):
 
         if img is None:
             img = self.frame
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        faces = self.detect(gray)
 
         if show:
             for (x, y, w, h) in faces:
@@ -61,20 +120,32 @@ class StressLevelDetector:
 
     def __call__(self, img, imname = "detector"):
         print(".")
+        self.frame_index = self.img_count
+        self.frame_time = time.monotonic_ns()
+        self.img_count += 1
+
+        if self.motion_gate is not None and not self.motion_gate.changed(img):
+            # Nothing moved: keep the last detection and only leave a heartbeat
+            if self.save_frame:
+                with open(f"./output/{self.init_time}/heartbeat.csv", "a") as file:
+                    file.write(f"{self.frame_index},{self.frame_time},{self.motion_gate.difference:.2f}\n")
+            return self.get_stress_level()
+
         if self.save_frame:
-            cv2.imwrite(f"./frames/{self.init_time}/{self.img_count}.jpg", img)
+            with open(f"./output/{self.init_time}/frames.csv", "a") as file:
+                file.write(f"{self.frame_index},{self.frame_time}\n")
+            cv2.imwrite(f"./{SESSIONS_FOLDER}/{self.init_time}/{self.frame_index}.jpg", img)
 
-        out_img, frames = self.process_frame(img)
+        out_img, self.faces = self.process_frame(img)
 
         if self.save_frame:
-            with open(f"./output/{self.init_time}/{self.img_count}.csv","a") as file:
+            with open(f"./output/{self.init_time}/{self.frame_index}.csv","a") as file:
                 file.write(
                     "\n".join(
                         [",".join([str(a) for a in arr]
-                                  ) for arr in frames]
+                                  ) for arr in self.faces]
                     )
                 )
-            self.img_count += 1
 
         return self.get_stress_level()
 
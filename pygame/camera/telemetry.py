@@ -0,0 +1,95 @@
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import TELEMETRY_BUFFER_SIZE, TELEMETRY_FLUSH_TIME
+
+
+# Event kinds
+EVENT_PRESS = 0
+EVENT_RELEASE = 1
+EVENT_DRAG = 2
+EVENT_NEW_FIGURE = 3
+EVENT_HOVER = 4
+
+EVENT_NAMES = ["press", "release", "drag", "new_figure", "hover"]
+
+# One record per event, written as-is to telemetry.bin (little endian, 32 bytes)
+EVENT_DTYPE = np.dtype([("time", "<i8"),    # time.monotonic_ns(), same clock as the detector
+                        ("frame", "<i8"),   # index of the last camera frame
+                        ("kind", "<i4"),
+                        ("figure", "<i4"),  # figure id, -1 if none
+                        ("x", "<f4"),
+                        ("y", "<f4")])
+
+
+class TelemetryRecorder:
+    """
+    Records user interactions in a preallocated ring buffer from the UI thread
+    and flushes them in binary batches from a background thread.
+    """
+
+    def __init__(self, detector, size=TELEMETRY_BUFFER_SIZE, flush_time=TELEMETRY_FLUSH_TIME):
+        self.detector = detector
+        self.size = size
+        self.flush_time = flush_time
+        self.buffer = np.zeros(size, dtype=EVENT_DTYPE)
+
+        # head is only written by the UI thread, tail only by the writer thread
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+        self.path = Path(f"output/{detector.init_time}/telemetry.bin")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.stop_event = threading.Event()
+        self.writer_thread = threading.Thread(target=self.writer, daemon=True)
+        self.writer_thread.start()
+
+    def record(self, kind, pos=(0, 0), figure=-1):
+        if self.head - self.tail >= self.size:
+            self.dropped += 1
+            return
+        self.buffer[self.head % self.size] = (time.monotonic_ns(), self.detector.frame_index,
+                                              kind, figure, pos[0], pos[1])
+        self.head += 1
+
+    def flush(self, file):
+        head = self.head
+        if head == self.tail:
+            return
+        start, end = self.tail % self.size, head % self.size
+        if start < end:
+            file.write(self.buffer[start:end].tobytes())
+        else:
+            file.write(self.buffer[start:].tobytes())
+            file.write(self.buffer[:end].tobytes())
+        file.flush()
+        self.tail = head
+
+    def writer(self):
+        with open(self.path, "ab") as file:
+            while not self.stop_event.wait(self.flush_time):
+                self.flush(file)
+            self.flush(file)
+
+    def close(self):
+        self.stop_event.set()
+        self.writer_thread.join()
+        if self.dropped:
+            print(f"telemetry: {self.dropped} events dropped")
+
+
+def load(path):
+    return np.fromfile(path, dtype=EVENT_DTYPE)
+
+
+if __name__ == "__main__":
+    import sys
+
+    events = load(sys.argv[1])
+    for e in events:
+        print(e["time"], e["frame"], EVENT_NAMES[e["kind"]], e["figure"], e["x"], e["y"])
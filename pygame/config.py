@@ -22,9 +22,58 @@ COLOR_BUTTON_PASIVE = COLOR_LIGHT_GRAY
 # GRID
 FONT_SIZE = 25
 
+# Snapping
+SNAP_RADIUS = 8  # pixels
+SNAP_BUCKET = 1  # world units per spatial hash cell
+SNAP_LATTICE = True  # snap to integer coordinates
+
+# Undo history
+HISTORY_SIZE = 1000  # commands kept
+HISTORY_CHECKPOINT = 50  # commands between scene checkpoints
+
+# Function graphs
+FUNCTION_DEFAULT_EXPRESSION = "sin(x)"
+FUNCTION_SAMPLES = 64  # initial uniform samples over the visible range
+FUNCTION_TOLERANCE = 0.5  # pixels between the curve and its polyline
+FUNCTION_MAX_DEPTH = 8  # refinement passes
+
+# Polygons
+POLYGON_SIDES = 6  # sides of the regular polygon created from the header
+POLYGON_RADIUS = 2  # world units from the center to each vertex
+
+# Export
+EXPORT_FOLDER = "output/exports"
+EXPORT_SCALE = 4  # times the screen resolution
+EXPORT_TILE = 512  # pixels per side of each off-screen tile
+
 # Camera
 CAPTURE_TIME = 5
 OUT_FOLDER = "output/csv"
 FRAMES_FOLDER = "output/frames"
+# Haar cascade settings, camera/cascade_benchmark.py --write-config updates them
+CASCADE_SCALE_FACTOR = 1.1
+CASCADE_MIN_NEIGHBORS = 4
+CASCADE_MIN_SIZE = 0  # pixels, 0 means no minimum
+CASCADE_INPUT_SCALE = 1.0  # frames are resized by this factor before detection
+MOTION_SIZE = (64, 48)  # downsampled grayscale frame compared between captures
+MOTION_THRESHOLD = 4  # mean absolute gray level difference that counts as movement
+MOTION_MAX_SKIP = 12  # unchanged frames before detection runs anyway
+
+# Classroom service
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 4  # detectors shared by all streams
+SERVICE_MAX_LATENCY = 2  # seconds, target frame age when detection ends, frames that would miss it are dropped
+
+# Scene broadcast
+BROADCAST_ROLE = None  # "teacher", "student" or None
+BROADCAST_HOST = "127.0.0.1"
+BROADCAST_PORT = 8766
+BROADCAST_MAX_BACKLOG = 1 << 20  # bytes queued for a slow student before dropping it
+BROADCAST_RETRY = 1  # seconds between a student's connection attempts
+
+# Telemetry
+TELEMETRY_BUFFER_SIZE = 8192  # events kept in memory between flushes
+TELEMETRY_FLUSH_TIME = 1  # seconds between binary batch writes
 
 # Messages
@@ -0,0 +1,313 @@
+"""
+Teacher -> student scene synchronization over local TCP sockets.
+
+The teacher collects the figures touched during a frame, keeps only their last
+state and sends one packet per frame to every student:
+
+    header: frame (uint32), record count (uint16)
+    record: op (uint8), kind (uint8), id (uint32), x, y, slope (float32),
+            shape length (uint32), shape (bytes)
+
+The shape is what the geometry does not cover: the utf-8 expression of a
+function graph, or the vertex offsets of a polygon as float32 pairs. It is
+sent when a figure is created and whenever it changes, an empty shape means
+unchanged.
+
+Records carry absolute geometry, so coalescing moves never loses information
+and a late student only needs one snapshot of the scene. A student that is
+dropped or loses the teacher keeps retrying every BROADCAST_RETRY seconds and
+starts again from a fresh snapshot.
+"""
+
+import errno
+import select
+import socket
+import struct
+import time
+
+import numpy as np
+
+from config import BROADCAST_HOST, BROADCAST_PORT, BROADCAST_MAX_BACKLOG, BROADCAST_RETRY
+
+OP_CREATE = 0
+OP_MOVE = 1
+OP_DELETE = 2
+
+KINDS = ["figure", "point", "line", "function", "polygon"]
+
+HEADER = struct.Struct("<IH")
+RECORD = struct.Struct("<BBIfffI")
+MAX_RECORDS = 0xFFFF
+
+
+def encode(frame, records):
+    packets = []
+    for start in range(0, max(len(records), 1), MAX_RECORDS):
+        chunk = records[start:start + MAX_RECORDS]
+        packet = bytearray(HEADER.pack(frame, len(chunk)))
+        for *fields, shape in chunk:
+            packet += RECORD.pack(*fields, len(shape))
+            packet += shape
+        packets.append(packet)
+    return b"".join(packets)
+
+
+def figure_shape(figure):
+    if figure.kind == "function":
+        return figure.expression.encode()
+    if figure.kind == "polygon":
+        return figure.offsets.astype("<f4").tobytes()
+    return b""
+
+
+def decode_shape(kind, shape):
+    if not shape:
+        return None
+    if KINDS[kind] == "function":
+        return shape.decode()
+    return np.frombuffer(shape, dtype="<f4").reshape(-1, 2).astype(float)
+
+
+def figure_record(op, figure, shape=b""):
+    return (op, KINDS.index(figure.kind), figure.id) + tuple(figure.get_geometry()) + (shape,)
+
+
+class SceneBroadcaster:
+    """
+    Teacher side. Register it as a Cartesian_plane listener and call flush once per frame.
+    """
+
+    def __init__(self, host=BROADCAST_HOST, port=BROADCAST_PORT, max_backlog=BROADCAST_MAX_BACKLOG):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen()
+        self.server.setblocking(False)
+        self.port = self.server.getsockname()[1]
+
+        self.max_backlog = max_backlog
+        self.clients = {}  # socket -> pending bytes
+        self.pending = {}  # figure id -> (op, figure), coalesced within a frame
+        self.shapes = {}  # figure id -> last shape sent
+        self.frame = 0
+
+    def on_new_figure(self, figure):
+        self.pending[figure.id] = (OP_CREATE, figure)
+
+    def on_move_figure(self, figure):
+        if figure.id not in self.pending:
+            self.pending[figure.id] = (OP_MOVE, figure)
+
+    def on_delete_figure(self, figure):
+        if self.pending.get(figure.id, (None,))[0] == OP_CREATE:
+            # Students never saw it
+            del self.pending[figure.id]
+        else:
+            self.pending[figure.id] = (OP_DELETE, figure)
+        self.shapes.pop(figure.id, None)
+
+    def record(self, op, figure):
+        if op == OP_DELETE:
+            return figure_record(op, figure)
+        shape = figure_shape(figure)
+        if op == OP_MOVE and self.shapes.get(figure.id) == shape:
+            return figure_record(op, figure)
+        self.shapes[figure.id] = shape
+        return figure_record(op, figure, shape)
+
+    def accept(self, figures):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            snapshot = [figure_record(OP_CREATE, f, figure_shape(f)) for f in figures]
+            self.clients[client] = bytearray(encode(self.frame, snapshot))
+
+    def send(self, client):
+        backlog = self.clients[client]
+        try:
+            sent = client.send(backlog)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(client)
+            return
+        del backlog[:sent]
+        if len(backlog) > self.max_backlog:
+            # The student can reconnect and get a fresh snapshot
+            self.drop(client)
+
+    def drop(self, client):
+        del self.clients[client]
+        client.close()
+
+    def flush(self, figures):
+        self.accept(figures)
+        if self.pending:
+            packet = encode(self.frame, [self.record(op, f) for op, f in self.pending.values()])
+            self.pending.clear()
+            for backlog in self.clients.values():
+                backlog += packet
+        for client in list(self.clients):
+            if self.clients[client]:
+                self.send(client)
+        self.frame += 1
+
+    def close(self):
+        for client in list(self.clients):
+            self.drop(client)
+        self.server.close()
+
+
+class SceneReceiver:
+    """
+    Student side. Call poll once per frame and apply the returned records.
+    """
+
+    def __init__(self, host=BROADCAST_HOST, port=BROADCAST_PORT, retry=BROADCAST_RETRY):
+        self.address = (host, port)
+        self.retry = retry
+        self.socket = None
+        self.connecting = False  # connect_ex started, waiting for the socket to become writable
+        self.last_attempt = None
+        self.buffer = bytearray()
+        self.frame = None
+        self.fresh = False  # connected since the last apply, the remote scene starts over
+        self.connect()
+
+    def connect(self):
+        # Non-blocking, poll() finishes the connection in a later frame
+        self.last_attempt = time.monotonic()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setblocking(False)
+        error = self.socket.connect_ex(self.address)
+        if error in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.connecting = True
+        else:
+            self.disconnect()
+
+    def finish_connect(self):
+        """Returns True once the pending connection is established."""
+        _, writable, _ = select.select([], [self.socket], [], 0)
+        if not writable:
+            if time.monotonic() - self.last_attempt > self.retry:
+                self.disconnect()
+            return False
+        self.connecting = False
+        if self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            self.disconnect()
+            return False
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer.clear()
+        self.fresh = True
+        return True
+
+    def disconnect(self):
+        self.socket.close()
+        self.socket = None
+        self.connecting = False
+        self.buffer.clear()
+
+    def poll(self):
+        if self.socket is None:
+            if time.monotonic() - self.last_attempt < self.retry:
+                return []
+            self.connect()
+        if self.connecting and not self.finish_connect():
+            return []
+
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                # The teacher closed the connection or dropped this student
+                self.disconnect()
+                return []
+            self.buffer += data
+
+        records = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            packet = self.parse_packet(offset)
+            if packet is None:
+                break  # incomplete, wait for the rest
+            self.frame, packet_records, offset = packet
+            records.extend(packet_records)
+        del self.buffer[:offset]
+        return records
+
+    def parse_packet(self, offset):
+        frame, count = HEADER.unpack_from(self.buffer, offset)
+        offset += HEADER.size
+        records = []
+        for _ in range(count):
+            if len(self.buffer) - offset < RECORD.size:
+                return None
+            *fields, length = RECORD.unpack_from(self.buffer, offset)
+            offset += RECORD.size
+            if len(self.buffer) - offset < length:
+                return None
+            records.append((*fields, bytes(self.buffer[offset:offset + length])))
+            offset += length
+        return frame, records, offset
+
+    def apply(self, plane):
+        records = self.poll()
+        if self.fresh:
+            plane.clear_remote()
+            self.fresh = False
+        for op, kind, id, x, y, slope, shape in records:
+            if op == OP_DELETE:
+                plane.apply_delete(id)
+            else:
+                plane.apply_figure(id, KINDS[kind], (x, y, slope), decode_shape(kind, shape))
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+
+
+if __name__ == '__main__':
+    # Loopback demo: one teacher dragging a point, 30 students
+    import time
+    import pygame
+
+    from .figures import Point
+
+    screen = pygame.Surface((800, 600))
+    teacher = SceneBroadcaster(port=0)
+    students = [SceneReceiver(port=teacher.port) for _ in range(30)]
+    scenes = [{} for _ in students]
+
+    figures = []
+    for n in range(100):
+        point = Point((n * 8, 300), screen)
+        point.id = n
+        figures.append(point)
+
+    sent = 0
+    start = time.perf_counter()
+    for frame in range(600):
+        figures[0].move(pos=(frame % 800, 200))
+        teacher.on_move_figure(figures[0])
+        teacher.flush(figures)
+        sent += len(encode(0, [figure_record(OP_MOVE, figures[0])]))
+        for student, scene in zip(students, scenes):
+            for op, kind, id, x, y, slope, shape in student.poll():
+                scene[id] = (x, y)
+    elapsed = time.perf_counter() - start
+
+    time.sleep(0.1)
+    for student, scene in zip(students, scenes):
+        for op, kind, id, x, y, slope, shape in student.poll():
+            scene[id] = (x, y)
+
+    print(f"{elapsed / 600 * 1000:.3f} ms per frame, {sent / 600:.0f} bytes per frame and student")
+    print("in sync:", all(scene[0] == tuple(figures[0].pos) and len(scene) == 100 for scene in scenes))
@@ -4,8 +4,11 @@ import numpy as np
 
 from config import *
 
-from .figures import Figure, Point, Line
+from .figures import Figure, Point, Line, FunctionGraph, Polygon
 from .grid import Grid
+from .snapping import SnapEngine
+from .history import History
+from .measurements import MeasurementEngine
 
 
 # init with app
@@ -24,13 +27,29 @@ class Cartesian_plane(Grid):
                          self.screen)
 
         self.figures = []
+        self.figures_by_id = {}
+        self.next_id = 0
+        self.remote_figures = {}  # teacher id -> local figure, remote ids never clash with local ones
         self.selected_figure = None
         self.hovered_figure = None
 
+        self.snapping = SnapEngine()
+        self.history = History(self)
+        self.measurements = MeasurementEngine(self)
+
+        # Objects notified with on_new_figure(figure), on_move_figure(figure)
+        # and on_delete_figure(figure), the latter before the figure is removed
+        self.listeners = [self.snapping, self.history, self.measurements]
+
     def draw(self, mouse_pos=None):
         self.draw_grid()
-        for figure in self.figures:
-            figure.draw()
+        if self.figures:
+            # One transform for every figure point in the scene
+            points = [figure.world_points() for figure in self.figures]
+            screen_points = self.to_screen(np.concatenate(points))
+            splits = np.cumsum([len(p) for p in points])[:-1]
+            for figure, pts in zip(self.figures, np.split(screen_points, splits)):
+                figure.draw(pts)
 
         if mouse_pos:  # draw coordinates on screen
             mouse_grid_pos = self.get_cartesian_coordinates(mouse_pos)
@@ -39,46 +58,151 @@ class Cartesian_plane(Grid):
             self.screen.blit(text_surf, mouse_pos)
 
     def move_figure(self, pos=None, rel=None):
+        self.history.begin_move(self.selected_figure)
         if pos:
+            pos = self.to_world(pos)
+            if self.selected_figure.snaps():
+                pos = self.snapping.snap(pos, SNAP_RADIUS * self.pixel_size, exclude=self.selected_figure.id)
             self.selected_figure.move(pos=pos)
         else:
-            self.selected_figure.move(rel=rel)
+            self.selected_figure.move(rel=np.array(rel) * (self.pixel_size, -self.pixel_size))
+        for listener in self.listeners:
+            listener.on_move_figure(self.selected_figure)
 
     def clear_figures_state(self):
         for v in self.figures:
             v.set_state(False)
 
-    def new_figure(self, user, type):
-
+    def create_figure(self, type, pos, id=None):
         if type == "figure":
-            self.figures.append(
-                Figure(
-                    user.mouse_pos,
-                    self.screen,
-                    self.font)
-            )
+            figure = Figure(pos, self.screen, self.font)
         elif type == "point":
-            self.figures.append(
-                Point(
-                    user.mouse_pos,
-                    self.screen, )
-            )
+            figure = Point(pos, self.screen)
         elif type == "line":
-            self.figures.append(
-                Line(
-                    user.mouse_pos,
-                    self.screen)
-            )
+            figure = Line(pos, self.screen)
+        elif type == "function":
+            figure = FunctionGraph(pos, self.screen, self)
+        elif type == "polygon":
+            figure = Polygon(pos, self.screen)
+        else:
+            return None
+
+        if id is None:
+            id = self.next_id
+        self.next_id = max(self.next_id, id + 1)
+        figure.id = id
+        self.figures.append(figure)
+        self.figures_by_id[id] = figure
+        return figure
+
+    def new_figure(self, user, type):
+        figure = self.create_figure(type, self.to_world(user.mouse_pos))
+        if figure is not None:
+            for listener in self.listeners:
+                listener.on_new_figure(figure)
+
+    def restore_figure(self, id, type, data, index=None):
+        figure = self.figures_by_id.get(id)
+        if figure is not None:
+            figure.restore(data)
+            for listener in self.listeners:
+                listener.on_move_figure(figure)
+            return figure
+
+        figure = self.create_figure(type, data[:2], id)
+        figure.restore(data)
+        if index is not None:
+            self.figures.insert(index, self.figures.pop())
+        for listener in self.listeners:
+            listener.on_new_figure(figure)
+        return figure
+
+    def set_expression(self, figure, expression):
+        """Changes a function graph's expression, returns an error message if it is invalid."""
+        try:
+            figure.set_expression(expression)
+        except ValueError as error:
+            return str(error)
+        for listener in self.listeners:
+            listener.on_move_figure(figure)
+        return None
+
+    def update_figure(self, figure, geometry):
+        figure.set_geometry(*geometry)
+        for listener in self.listeners:
+            listener.on_move_figure(figure)
+
+    def remove_figures(self, figures):
+        if len(figures) == 1:
+            self.figures.remove(figures[0])
+        else:
+            ids = {figure.id for figure in figures}
+            self.figures = [f for f in self.figures if f.id not in ids]
+        for figure in figures:
+            del self.figures_by_id[figure.id]
+        if self.selected_figure in figures:
+            self.selected_figure = None
+        if self.hovered_figure in figures:
+            self.hovered_figure = None
+
+    def delete_figures(self, figures):
+        for figure in figures:
+            for listener in self.listeners:
+                listener.on_delete_figure(figure)
+        self.remove_figures(figures)
+
+    def delete_figure(self, figure):
+        self.delete_figures([figure])
+
+    def delete_selected(self):
+        self.delete_figures([f for f in self.figures if f.selected and not f.remote])
+
+    def apply_figure(self, id, type, geometry, shape=None):
+        """Creates or updates a figure from a remote scene, without notifying listeners.
+
+        shape is a function graph's expression or a polygon's vertex offsets, None if unchanged.
+        """
+        figure = self.remote_figures.get(id)
+        if figure is None or self.figures_by_id.get(figure.id) is not figure:
+            figure = self.create_figure(type, geometry[:2])
+            figure.remote = True
+            self.remote_figures[id] = figure
+        if shape is not None:
+            if type == "function":
+                try:
+                    figure.set_expression(shape)
+                except ValueError as error:
+                    print(f"remote figure {id}: {error}")
+            elif type == "polygon":
+                figure.set_vertices(np.asarray(geometry[:2]) + shape)
+        figure.set_geometry(*geometry)
+        self.snapping.update_figure(figure)
+        self.measurements.on_move_figure(figure)
+
+    def apply_delete(self, id):
+        figure = self.remote_figures.pop(id, None)
+        if figure is not None and self.figures_by_id.get(figure.id) is figure:
+            self.snapping.remove_figure(figure.id)
+            self.measurements.on_delete_figure(figure)
+            self.remove_figures([figure])
+
+    def clear_remote(self):
+        for id in list(self.remote_figures):
+            self.apply_delete(id)
 
     def check_movement(self, moving, user):
+        was_moving = moving
         if self.selected_figure is None:
-            return False
+            moving = False
         elif user.mouse_button_pressed:
             if self.selected_figure.check_hover and user.mouse_motion:
                 moving = True
         else:
             moving = False
 
+        if was_moving and not moving:
+            # The whole drag becomes a single history entry
+            self.history.end_move()
         return moving
 
     def check_figures(self, user):
@@ -94,12 +218,16 @@ class Cartesian_plane(Grid):
             self.clear_figures_state()
 
         self.hovered_figure = None
+        mouse_pos = self.to_world(user.mouse_pos)
         for f in self.figures:
-            if f.check_hover(user.mouse_pos):
+            if f.remote:
+                continue
+            if f.check_hover(mouse_pos, self.pixel_size):
                 self.hovered_figure = f
                 if user.mouse_button_pressed:
                     f.set_state(True)
                     self.selected_figure = f
+                    self.measurements.select(f)
 
     def run(self, user):
 
@@ -109,6 +237,9 @@ class Cartesian_plane(Grid):
 
     def get_hovered_text(self):
         if self.hovered_figure:
-            return f"{self.hovered_figure} in {self.get_cartesian_coordinates(self.hovered_figure.pos)}"
+            x, y = self.hovered_figure.pos
+            text = f"{self.hovered_figure} in ({round(float(x), 2)}, {round(float(y), 2)})"
+            measurements = self.measurements.text(self.hovered_figure)
+            return f"{text}, {measurements}" if measurements else text
         else:
             return ""
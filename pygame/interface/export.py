@@ -0,0 +1,141 @@
+"""
+High resolution export of the Cartesian plane.
+
+The scene is snapshotted on the UI thread (figures are shallow copied, their
+world points computed once) and rendered by a background thread:
+
+- PNG: the image is rendered in tiles of EXPORT_TILE pixels. One row of tiles
+  is encoded and streamed to the file before the next one is drawn, so peak
+  memory is one strip, whatever the scale.
+- SVG: grid and figures are written as vector primitives in plane pixels.
+"""
+
+import copy
+import struct
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pygame
+
+from config import COLOR_BACKGROUND, COLOR_DARK_GRAY, FONT_SIZE, EXPORT_FOLDER, EXPORT_SCALE, EXPORT_TILE
+from .figures import svg_color
+from .grid import apply, compose
+
+
+def png_chunk(file, kind, data):
+    file.write(struct.pack(">I", len(data)))
+    file.write(kind + data)
+    file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+class SceneExporter:
+    def __init__(self, plane, scale=EXPORT_SCALE, tile=EXPORT_TILE, folder=EXPORT_FOLDER):
+        self.plane = plane
+        self.scale = scale
+        self.tile = tile
+        self.folder = Path(folder)
+        self.thread = None
+        self.last_path = None
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def snapshot(self):
+        figures = [copy.copy(figure) for figure in self.plane.figures]
+        points = [figure.world_points() for figure in figures]
+        return figures, points, self.plane.world_to_screen.copy()
+
+    def export(self, format="png"):
+        """Starts rendering in the background, returns the output path or None if an export is running."""
+        if self.busy():
+            return None
+        self.folder.mkdir(parents=True, exist_ok=True)
+        name = datetime.now().strftime('%m%d%Y%H%M%S%f')[:-3]  # milliseconds
+        path = self.folder / f"{name}.{format}"
+        count = 1
+        while path.exists():
+            path = self.folder / f"{name}_{count}.{format}"
+            count += 1
+        render = self.render_png if format == "png" else self.render_svg
+        self.thread = threading.Thread(target=render, args=(self.snapshot(), path), daemon=True)
+        self.thread.start()
+        self.last_path = path
+        return path
+
+    def render_png(self, snapshot, path):
+        figures, points, world_to_screen = snapshot
+        left, top, right, bottom = self.plane.plane_area()
+        scale, tile = self.scale, self.tile
+        width, height = (right - left) * scale, (bottom - top) * scale
+        font = pygame.font.Font(None, FONT_SIZE * scale)
+        margin = 4 * FONT_SIZE * scale  # labels of lines in the previous tile can reach into this one
+
+        surface = pygame.Surface((tile, tile))
+        compressor = zlib.compressobj(6)
+        with open(path, "wb") as file:
+            file.write(b"\x89PNG\r\n\x1a\n")
+            png_chunk(file, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+            for ty in range(0, height, tile):
+                strip = np.zeros((min(tile, height - ty), width * 3 + 1), dtype=np.uint8)  # filter byte + RGB
+                for tx in range(0, width, tile):
+                    # plane pixels -> tile pixels
+                    to_tile = np.array(((scale, 0, -left * scale - tx),
+                                        (0, scale, -top * scale - ty)), dtype=float)
+                    matrix = compose(to_tile, world_to_screen)
+
+                    surface.fill(COLOR_BACKGROUND)
+                    self.plane.draw_grid(surface, matrix, (-margin, -margin, tile + margin, tile + margin),
+                                         font, scale)
+                    for figure, pts in zip(figures, points):
+                        figure.draw(apply(matrix, pts), surface, scale)
+
+                    w, h = min(tile, width - tx), strip.shape[0]
+                    pixels = pygame.surfarray.array3d(surface)[:w, :h].transpose(1, 0, 2)
+                    strip[:, 1 + tx * 3:1 + (tx + w) * 3] = pixels.reshape(h, w * 3)
+
+                png_chunk(file, b"IDAT", compressor.compress(strip.tobytes()))
+            png_chunk(file, b"IDAT", compressor.flush())
+            png_chunk(file, b"IEND", b"")
+        print(f"exported {path}")
+
+    def render_svg(self, snapshot, path):
+        figures, points, world_to_screen = snapshot
+        left, top, right, bottom = self.plane.plane_area()
+        width, height = right - left, bottom - top
+        to_plane = np.array(((1, 0, -left), (0, 1, -top)), dtype=float)
+        matrix = compose(to_plane, world_to_screen)
+        xs, screen_x, ys, screen_y, axis_x, axis_y = self.plane.grid_lines(matrix, (0, 0, width, height))
+
+        lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * self.scale}" '
+                 f'height="{height * self.scale}" viewBox="0 0 {width} {height}">',
+                 f'<rect width="{width}" height="{height}" fill="{svg_color(COLOR_BACKGROUND)}"/>']
+        for n, x in zip(xs, screen_x):
+            color = "rgb(0,0,0)" if n == 0 else "rgb(220,220,220)"
+            lines.append(f'<line x1="{x:.2f}" y1="0" x2="{x:.2f}" y2="{height}" stroke="{color}"/>')
+        for n, y in zip(ys, screen_y):
+            color = "rgb(0,0,0)" if n == 0 else "rgb(220,220,220)"
+            lines.append(f'<line x1="0" y1="{y:.2f}" x2="{width}" y2="{y:.2f}" stroke="{color}"/>')
+
+        label = f'font-family="sans-serif" font-size="{FONT_SIZE * 0.7:.1f}" fill="{svg_color(COLOR_DARK_GRAY)}"'
+        for n, x in zip(xs, screen_x):
+            if n % 5 == 0:
+                lines.append(f'<line x1="{x:.2f}" y1="{axis_y - 5:.2f}" x2="{x:.2f}" y2="{axis_y + 5:.2f}" '
+                             f'stroke="rgb(0,0,0)"/>')
+                lines.append(f'<text x="{x + 2:.2f}" y="{axis_y + 16:.2f}" {label}>{n}</text>')
+        for n, y in zip(ys, screen_y):
+            if (n % 5 == 0) and (n != 0):
+                lines.append(f'<line x1="{axis_x - 5:.2f}" y1="{y:.2f}" x2="{axis_x + 5:.2f}" y2="{y:.2f}" '
+                             f'stroke="rgb(0,0,0)"/>')
+                lines.append(f'<text x="{axis_x + 2:.2f}" y="{y + 16:.2f}" {label}>{n}</text>')
+
+        for figure, pts in zip(figures, points):
+            lines.append(figure.svg(apply(matrix, pts)))
+        lines.append("</svg>")
+
+        with open(path, "w") as file:
+            file.write("\n".join(lines))
+        print(f"exported {path}")
@@ -1,10 +1,25 @@
+import ast
+
 import numpy as np
 import pygame
 
-from config import COLOR_BUTTON_PASIVE, COLOR_BUTTON_HOVERED, COLOR_BUTTON_ACTIVE, COLOR_BLACK
+from config import COLOR_BUTTON_PASIVE, COLOR_BUTTON_HOVERED, COLOR_BUTTON_ACTIVE, COLOR_BLACK, \
+    FUNCTION_DEFAULT_EXPRESSION, FUNCTION_SAMPLES, FUNCTION_TOLERANCE, FUNCTION_MAX_DEPTH, \
+    POLYGON_SIDES, POLYGON_RADIUS
+
+def svg_color(color):
+    return "rgb({},{},{})".format(*color)
+
+
+# Figures live in cartesian (world) coordinates. The plane converts every
+# figure's world_points() to screen coordinates in one call per frame and
+# hands each figure its slice in draw(). Hover tests get the mouse in world
+# coordinates plus the size of a screen pixel in world units.
 
 
 class Figure:
+    kind = "figure"
+
     def __init__(self,
                  pos,
                  screen,
@@ -14,18 +29,20 @@ class Figure:
                  size=[10, 10]
                  ):
 
+        self.id = None
         self.text = text
         self.callback = callback
-        self.pos = np.array(pos)
-        self.size = np.array(size)
+        self.pos = np.array(pos, dtype=float)  # top left corner
+        self.size = np.array(size)  # pixels
         self.screen = screen
         self.font = font
         self.color = COLOR_BUTTON_PASIVE
 
         self.selected = False
         self.is_hovered = False
+        self.remote = False  # mirrored from the teacher, read-only for a student
 
-        self.rect = pygame.Rect(self.pos, self.size)
+        self.rect = None
 
         self.colors = {"hover": COLOR_BUTTON_HOVERED,
                        "selected": COLOR_BUTTON_ACTIVE,
@@ -34,41 +51,70 @@ class Figure:
 
 
     def __str__(self):
-        return "figure"
+        return self.kind
 
-    def check_hover(self, mouse_pos):
-        if self.rect.collidepoint(mouse_pos):
-            self.is_hovered = True
-        else:
-            self.is_hovered = False
+    def world_points(self):
+        return self.pos[np.newaxis]
+
+    def snaps(self):
+        # Whether dragging moves pos, so the drag position can be snapped
+        return True
+
+    def get_geometry(self):
+        return self.pos[0], self.pos[1], 0
+
+    def set_geometry(self, x, y, slope):
+        self.pos = np.array((x, y), dtype=float)
+
+    def dump(self):
+        # Everything needed to rebuild the figure, used by the undo history
+        return tuple(self.get_geometry())
+
+    def restore(self, data):
+        self.set_geometry(*data[:3])
+
+    def check_hover(self, mouse_pos, pixel):
+        dx, dy = (mouse_pos[0] - self.pos[0]) / pixel, (self.pos[1] - mouse_pos[1]) / pixel
+        self.is_hovered = 0 <= dx < self.size[0] and 0 <= dy < self.size[1]
         return self.is_hovered
 
     def move(self, rel=None, pos=None):
-        if rel:
-            self.rect.move_ip(rel)
+        if rel is not None:
+            self.pos = self.pos + rel
         else:
-            self.rect.x, self.rect.y = pos
+            self.pos = np.array(pos, dtype=float)
 
     def set_state(self, value):
         self.selected = value
 
-    def draw(self):
-
-        color = self.colors["hover"] if self.is_hovered else \
+    def get_color(self):
+        return self.colors["hover"] if self.is_hovered else \
             self.colors["selected"] if self.selected else \
                 self.colors["pasive"]
 
-        pygame.draw.rect(self.screen, color, self.rect)
+    def draw(self, pts, surface=None, scale=1):
+        # surface and scale are only given by the export, pixel sizes grow with scale
+        surface = self.screen if surface is None else surface
+        color = self.get_color()
+
+        self.rect = pygame.draw.rect(surface, color, pygame.Rect(tuple(pts[0]), tuple(self.size * scale)))
 
         if self.text:
             text_surface = self.font.render(self.text, True, COLOR_BLACK)
             # Center the text in the button
-            text_rect = text_surface.get_rect(center=self.pos + self.size / 2
+            text_rect = text_surface.get_rect(center=pts[0] + self.size * scale / 2
                                               )
-            self.screen.blit(text_surface, text_rect)
+            surface.blit(text_surface, text_rect)
+
+    def svg(self, pts):
+        x, y = pts[0]
+        return f'<rect x="{x:.2f}" y="{y:.2f}" width="{self.size[0]}" height="{self.size[1]}" ' \
+               f'fill="{svg_color(self.get_color())}"/>'
 
 
 class Point(Figure):
+    kind = "point"
+
     def __init__(self,
                  pos,
                  screen,
@@ -81,27 +127,32 @@ class Point(Figure):
         )
         self.radius = radius
         self.size = [self.radius * 2, self.radius * 2]
-        self.pos = (self.pos[0] , self.pos[1] )
-
-        self.rect = None
-        self.draw()
 
 
     def move(self, pos = None, rel = None):
-        if pos:
-            self.pos = pos
+        if pos is not None:
+            self.pos = np.array(pos, dtype=float)
         else:
-            self.pos = (self.pos[0]+rel[0], self.pos[1]+rel[1])
+            self.pos = self.pos + rel
 
-    def draw(self):
-        color = self.colors["hover"] if self.is_hovered else \
-                self.colors["selected"] if self.selected else \
-                self.colors["pasive"]
+    def check_hover(self, mouse_pos, pixel):
+        self.is_hovered = np.hypot(*(np.asarray(mouse_pos) - self.pos)) <= self.radius * pixel
+        return self.is_hovered
+
+    def draw(self, pts, surface=None, scale=1):
+        surface = self.screen if surface is None else surface
+        color = self.get_color()
+
+        self.rect = pygame.draw.circle(surface, color, pts[0], self.radius * scale)
+
+    def svg(self, pts):
+        x, y = pts[0]
+        return f'<circle cx="{x:.2f}" cy="{y:.2f}" r="{self.radius}" fill="{svg_color(self.get_color())}"/>'
 
-        self.rect = pygame.draw.circle(self.screen, color, self.pos, self.radius)
 
+class Line(Figure):
+    kind = "line"
 
-class Line(Figure): # TODO: manage coordenadas cartesianas
     def __init__(self,
                  pos,
                  screen,
@@ -111,28 +162,21 @@ class Line(Figure): # TODO: manage coordenadas cartesianas
             screen,
             font=None,
         )
-        self.range = 1000
+        self.range = 1000  # world units drawn on each side of the origin
         self.width = 2
-        self.proximity_range = 4
-
-        # self.pos = (self.pos[0], self.pos[1])  # initial point
+        self.proximity_range = 4  # pixels
 
         self.slope = 0
         self.b = None
+        self.direction = None
         self.coords = None
 
-        # self.set_slope(end)
         self.set_b()
         self.set_coords()
 
-        self.rect = None
-        self.orig_rect = None
-
         self.setting_slope = True
         self.initialized = False
 
-        self.draw()
-
     def set_slope(self, end):
         if end[0] == self.pos[0]:
             self.slope = np.inf
@@ -140,55 +184,375 @@ class Line(Figure): # TODO: manage coordenadas cartesianas
             self.slope = (end[1] - self.pos[1]) / (end[0] - self.pos[0])
 
     def set_b(self):
-        self.b = self.pos[1] - (self.slope * self.pos[0])
+        self.b = self.pos[1] - (self.slope * self.pos[0]) if np.isfinite(self.slope) else np.nan
+
+    def set_coords(self):
+        if np.isfinite(self.slope):
+            self.direction = np.array((1, self.slope)) / np.sqrt(1 + self.slope ** 2)
+        else:
+            self.direction = np.array((0.0, 1.0))
+        self.coords = (self.pos - self.range * self.direction, self.pos + self.range * self.direction)
+
+    def world_points(self):
+        return np.array((self.pos, self.coords[0], self.coords[1]))
 
-    def set_coords(self): # TODO: Manage division por 0
-        s = (self.pos[0] - self.range, ((self.pos[0] - self.range) * self.slope) + self.b)
-        e = (self.pos[0] + self.range, ((self.pos[0] + self.range) * self.slope) + self.b)
-        self.coords = (s, e)
+    def snaps(self):
+        return not self.setting_slope
 
     def move(self, pos=None, rel=None):
-        # print("moving", np.array(pos)-np.array(self.pos))
         if self.setting_slope:
             self.set_slope(pos)
         else:
-            if pos:
-                self.pos = pos
+            if pos is not None:
+                self.pos = np.array(pos, dtype=float)
             else:
-                self.pos = (self.pos[0] + rel[0], self.pos[1] + rel[1])
+                self.pos = self.pos + rel
 
         self.set_b()
         self.set_coords()
 
-    def draw(self):
-        color = self.colors["hover"] if self.is_hovered else \
-            self.colors["selected"] if self.selected else \
-                self.colors["pasive"]
+    def get_geometry(self):
+        return self.pos[0], self.pos[1], self.slope
+
+    def set_geometry(self, x, y, slope):
+        self.pos = np.array((x, y), dtype=float)
+        self.slope = slope
+        self.set_b()
+        self.set_coords()
 
-        self.rect = pygame.draw.aaline(self.screen, color, self.coords[0], self.coords[1])#, self.width)
+    def draw(self, pts, surface=None, scale=1):
+        surface = self.screen if surface is None else surface
+        color = self.get_color()
+
+        if scale == 1:
+            self.rect = pygame.draw.aaline(surface, color, pts[1], pts[2])#, self.width)
+        else:
+            self.rect = pygame.draw.line(surface, color, pts[1], pts[2], scale)
 
         if self.is_hovered:
             if self.setting_slope:
-                self.orig_rect = pygame.draw.circle(self.screen, color, self.pos, self.proximity_range)
+                pygame.draw.circle(surface, color, pts[0], self.proximity_range * scale)
             else:
-                self.orig_rect = pygame.draw.circle(self.screen, (0,255,255), self.pos, self.proximity_range)
+                pygame.draw.circle(surface, (0,255,255), pts[0], self.proximity_range * scale)
+
+    def svg(self, pts):
+        (x1, y1), (x2, y2) = pts[1], pts[2]
+        return f'<line x1="{x1:.2f}" y1="{y1:.2f}" x2="{x2:.2f}" y2="{y2:.2f}" ' \
+               f'stroke="{svg_color(self.get_color())}"/>'
 
     def distance_to_line(self, pos):
-        # y = m*x + b / for ax+by+c=0 abs(ax+by+c)/sqrt(a**2+b**2)
-        return abs((-1 * pos[1]) + (self.slope * pos[0]) + self.b) / np.sqrt(1 + (self.slope ** 2))
+        # |cross(direction, pos - origin)|, works for vertical lines too
+        d = np.asarray(pos) - self.pos
+        return abs(self.direction[0] * d[1] - self.direction[1] * d[0])
 
-    def check_hover(self, mouse_pos):
+    def check_hover(self, mouse_pos, pixel):
         # split hover
         self.initialized = self.selected or self.initialized
 
-        if self.slope is not None:
-            if self.distance_to_line(mouse_pos) < self.proximity_range:
-                self.is_hovered = True
-                if self.orig_rect is not None:
-                    if self.orig_rect.collidepoint(mouse_pos) and self.initialized:
-                        self.setting_slope = False
-                    else:
-                        self.setting_slope = True
+        if self.distance_to_line(mouse_pos) < self.proximity_range * pixel:
+            self.is_hovered = True
+            near_origin = np.hypot(*(np.asarray(mouse_pos) - self.pos)) <= self.proximity_range * pixel
+            self.setting_slope = not (near_origin and self.initialized)
+        else:
+            self.is_hovered = False
+        return self.is_hovered
+
+
+# Names available in function expressions, besides x
+FUNCTION_NAMESPACE = {name: getattr(np, name) for name in
+                      ("sin", "cos", "tan", "arcsin", "arccos", "arctan", "sinh", "cosh", "tanh",
+                       "exp", "log", "log10", "sqrt", "abs", "floor", "ceil", "sign", "pi", "e")}
+# Arithmetic and calls of the names above only, no attributes, subscripts or strings
+FUNCTION_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.operator, ast.unaryop, ast.Call, ast.Name,
+                  ast.Load, ast.Constant)
+
+
+def compile_expression(expression):
+    """Returns f(x) for an expression of x, raises ValueError if it is not a valid one."""
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise ValueError(f"invalid expression: {expression}")
+    for node in ast.walk(tree):
+        if not isinstance(node, FUNCTION_NODES):
+            raise ValueError(f"not allowed in an expression: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id != "x" and node.id not in FUNCTION_NAMESPACE:
+            raise ValueError(f"unknown name: {node.id}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"not a number: {node.value!r}")
+
+    # A fresh globals dict, eval would otherwise add the builtins to FUNCTION_NAMESPACE
+    function = eval(f"lambda x: {expression}", {"__builtins__": {}, **FUNCTION_NAMESPACE})
+    try:
+        with np.errstate(all="ignore"):
+            function(np.linspace(-1, 1, 3))
+    except Exception as error:  # wrong argument counts and the like only show up when called
+        raise ValueError(f"invalid expression: {expression} ({error})")
+    return function
+
+
+class FunctionGraph(Figure):
+    """
+    y = f(x - pos.x) + pos.y, sampled adaptively over the visible range of the grid.
+    The polyline is kept in world coordinates and only resampled when the
+    expression, the origin or the view changes.
+    """
+    kind = "function"
+
+    def __init__(self,
+                 pos,
+                 screen,
+                 grid,
+                 expression=FUNCTION_DEFAULT_EXPRESSION
+                 ):
+        super().__init__(
+            pos,
+            screen,
+            font=None,
+        )
+        self.grid = grid
+        self.proximity_range = 4  # pixels
+
+        self.expression = None
+        self.function = None
+        self.set_expression(expression)
+
+        self.cache_key = None
+        self.polyline = None  # (n, 2), rows of nan split the curve at discontinuities
+        self.polyline_x = None  # x column with the nan rows filled, sorted for hover lookups
+
+    def __str__(self):
+        return f"y = {self.expression}"
+
+    def set_expression(self, expression):
+        # Leaves the figure unchanged if the expression is invalid
+        self.function = compile_expression(expression)
+        self.expression = expression
+
+    def dump(self):
+        return tuple(self.get_geometry()) + (self.expression,)
+
+    def restore(self, data):
+        self.set_geometry(*data[:3])
+        self.set_expression(data[3])
+
+    def evaluate(self, x):
+        with np.errstate(all="ignore"):
+            y = np.broadcast_to(self.function(x - self.pos[0]), x.shape).astype(float)
+        return y + self.pos[1]
+
+    def sample(self):
+        (x_min, y_min), (x_max, y_max) = self.grid.visible_range()
+        tolerance = FUNCTION_TOLERANCE * self.grid.pixel_size
+        view_height = y_max - y_min
+
+        xs = np.linspace(x_min, x_max, FUNCTION_SAMPLES)
+        ys = self.evaluate(xs)
+        for _ in range(FUNCTION_MAX_DEPTH):
+            # Split the intervals whose midpoint is too far from the chord
+            xm = (xs[:-1] + xs[1:]) / 2
+            ym = self.evaluate(xm)
+            finite = np.isfinite(ys)
+            with np.errstate(invalid="ignore"):
+                refine = (np.abs(ym - (ys[:-1] + ys[1:]) / 2) > tolerance) | (finite[:-1] != finite[1:])
+            idx = np.flatnonzero(refine)
+            if len(idx) == 0:
+                break
+            xs = np.insert(xs, idx + 1, xm[idx])
+            ys = np.insert(ys, idx + 1, ym[idx])
+
+        # An interval that still spans the whole view after refining is a
+        # discontinuity only if its midpoint is not strictly between its ends,
+        # steep continuous curves (45 * x) pass through their midpoint
+        ys[~np.isfinite(ys)] = np.nan
+        with np.errstate(invalid="ignore"):
+            steep = np.flatnonzero(np.abs(np.diff(ys)) > view_height)
+            ym = self.evaluate((xs[steep] + xs[steep + 1]) / 2)
+            low, high = np.fmin(ys[steep], ys[steep + 1]), np.fmax(ys[steep], ys[steep + 1])
+            jumps = steep[~((low < ym) & (ym < high))] + 1
+        xs = np.insert(xs, jumps, np.nan)
+        ys = np.insert(ys, jumps, np.nan)
+        xs, ys = self.clip(xs, ys, y_min - view_height, y_max + view_height)
+
+        self.polyline = np.stack((xs, ys), axis=1)
+        self.polyline_x = np.fmax.accumulate(np.nan_to_num(xs, nan=-np.inf))
+
+    def clip(self, xs, ys, low, high):
+        # Adds the points where the polyline crosses low or high and breaks it
+        # outside the band, so the visible part of every segment keeps its slope
+        x0, x1, y0, y1 = xs[:-1], xs[1:], ys[:-1], ys[1:]
+        index, t, bounds = [], [], []
+        for bound in (low, high):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                crossing = np.flatnonzero((y0 - bound) * (y1 - bound) < 0)
+                index.append(crossing + 1)
+                t.append((bound - y0[crossing]) / (y1[crossing] - y0[crossing]))
+            bounds.append(np.full(len(crossing), bound))
+        index, t, bounds = np.concatenate(index), np.concatenate(t), np.concatenate(bounds)
+        order = np.lexsort((t, index))  # a segment crossing the whole band gets both points in order
+        index, t, bounds = index[order], t[order], bounds[order]
+
+        xs = np.insert(xs, index, x0[index - 1] + t * (x1[index - 1] - x0[index - 1]))
+        ys = np.insert(ys, index, bounds)
+        with np.errstate(invalid="ignore"):
+            outside = (ys < low) | (ys > high)
+        ys[outside] = np.nan
+        xs[np.isnan(ys)] = np.nan
+        return xs, ys
+
+    def update_polyline(self):
+        key = (self.expression, self.pos[0], self.pos[1], self.grid.view_version)
+        if key != self.cache_key:
+            self.sample()
+            self.cache_key = key
+
+    def world_points(self):
+        self.update_polyline()
+        return np.concatenate((self.pos[np.newaxis], self.polyline))
+
+    def move(self, pos=None, rel=None):
+        if pos is not None:
+            self.pos = np.array(pos, dtype=float)
+        else:
+            self.pos = self.pos + rel
+
+    def check_hover(self, mouse_pos, pixel):
+        self.update_polyline()
+        tolerance = self.proximity_range * pixel
+        lo = max(np.searchsorted(self.polyline_x, mouse_pos[0] - tolerance) - 1, 0)
+        hi = min(np.searchsorted(self.polyline_x, mouse_pos[0] + tolerance) + 1, len(self.polyline))
+        a, b = self.polyline[lo:hi - 1], self.polyline[lo + 1:hi]
+
+        self.is_hovered = False
+        if len(a):
+            ab = b - a
+            am = np.asarray(mouse_pos) - a
+            with np.errstate(invalid="ignore", divide="ignore"):
+                t = np.clip((am * ab).sum(axis=1) / (ab * ab).sum(axis=1), 0, 1)
+                distance = np.hypot(*(am - t[:, np.newaxis] * ab).T)
+            self.is_hovered = bool(np.nanmin(distance, initial=np.inf) < tolerance)
+        return self.is_hovered
+
+    def segments(self, pts):
+        # Continuous runs of the curve, split at the nan rows
+        curve = pts[1:]
+        breaks = np.flatnonzero(np.isnan(curve[:, 0]))
+        for segment in np.split(curve, breaks):
+            segment = segment[~np.isnan(segment[:, 0])]
+            if len(segment) > 1:
+                yield segment
+
+    def draw(self, pts, surface=None, scale=1):
+        surface = self.screen if surface is None else surface
+        color = self.get_color()
+
+        for segment in self.segments(pts):
+            if scale == 1:
+                self.rect = pygame.draw.aalines(surface, color, False, segment)
             else:
-                self.is_hovered = False
+                self.rect = pygame.draw.lines(surface, color, False, segment, scale)
+
+        if self.is_hovered:
+            pygame.draw.circle(surface, color, pts[0], self.proximity_range * scale)
+
+    def svg(self, pts):
+        color = svg_color(self.get_color())
+        return "\n".join(f'<polyline points="{" ".join(f"{x:.2f},{y:.2f}" for x, y in segment)}" '
+                         f'fill="none" stroke="{color}"/>' for segment in self.segments(pts))
+
+
+class Polygon(Figure):
+    """
+    Closed polygon with any number of vertices. pos is the first vertex and the
+    rest are kept as offsets from it, so moving the polygon leaves the bounding
+    box, area and perimeter (computed once per shape) untouched.
+    """
+    kind = "polygon"
+
+    def __init__(self,
+                 pos,
+                 screen,
+                 vertices=None,
+                 sides=POLYGON_SIDES,
+                 radius=POLYGON_RADIUS
+                 ):
+        super().__init__(
+            pos,
+            screen,
+            font=None,
+        )
+        if vertices is None:
+            # Regular polygon centered on pos
+            angles = np.pi / 2 + np.linspace(0, 2 * np.pi, sides, endpoint=False)
+            vertices = self.pos + radius * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+
+        self.offsets = None
+        self.bbox = None  # min and max offsets
+        self.edges = None  # (start, end, dx/dy) of every edge, for the crossing test
+        self.area = None
+        self.perimeter = None
+        self.set_vertices(vertices)
+
+    def __str__(self):
+        return f"polygon, area {self.area:.2f}"
+
+    def set_vertices(self, vertices):
+        vertices = np.asarray(vertices, dtype=float)
+        self.pos = vertices[0].copy()
+        self.offsets = vertices - vertices[0]
+        self.bbox = (self.offsets.min(axis=0), self.offsets.max(axis=0))
+
+        start, end = self.offsets, np.roll(self.offsets, -1, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse_slope = (end[:, 0] - start[:, 0]) / (end[:, 1] - start[:, 1])
+        self.edges = (start, end, inverse_slope)
+
+        # Shoelace formula
+        self.area = abs(np.dot(start[:, 0], end[:, 1]) - np.dot(end[:, 0], start[:, 1])) / 2
+        self.perimeter = np.hypot(*(end - start).T).sum()
+
+    def vertices(self):
+        return self.pos + self.offsets
+
+    def world_points(self):
+        return self.vertices()
+
+    def dump(self):
+        return tuple(self.get_geometry()) + (tuple(map(tuple, self.offsets.tolist())),)
+
+    def restore(self, data):
+        self.set_geometry(*data[:3])
+        self.set_vertices(self.pos + np.array(data[3]))
+
+    def move(self, pos=None, rel=None):
+        if pos is not None:
+            self.pos = np.array(pos, dtype=float)
+        else:
+            self.pos = self.pos + rel
+
+    def check_hover(self, mouse_pos, pixel):
+        x, y = mouse_pos[0] - self.pos[0], mouse_pos[1] - self.pos[1]
+        (x_min, y_min), (x_max, y_max) = self.bbox
+        if not (x_min <= x <= x_max and y_min <= y <= y_max):
+            self.is_hovered = False
+            return False
+
+        # Crossing number: count the edges that cross the horizontal ray going right from the mouse
+        start, end, inverse_slope = self.edges
+        straddles = (start[:, 1] > y) != (end[:, 1] > y)
+        with np.errstate(invalid="ignore"):
+            crossings = straddles & (x < start[:, 0] + (y - start[:, 1]) * inverse_slope)
+        self.is_hovered = bool(np.count_nonzero(crossings) % 2)
         return self.is_hovered
+
+    def draw(self, pts, surface=None, scale=1):
+        surface = self.screen if surface is None else surface
+        color = self.get_color()
+
+        self.rect = pygame.draw.polygon(surface, color, pts)
+        pygame.draw.polygon(surface, COLOR_BLACK, pts, scale)
+
+    def svg(self, pts):
+        points = " ".join(f"{x:.2f},{y:.2f}" for x, y in pts)
+        return f'<polygon points="{points}" fill="{svg_color(self.get_color())}" stroke="rgb(0,0,0)"/>'
+
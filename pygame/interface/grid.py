@@ -4,6 +4,21 @@ import pygame
 from config import COLOR_DARK_GRAY, COLOR_BLACK
 
 
+def apply(matrix, points):
+    # Applies a 2x3 affine matrix to a single (x, y) or to a whole (n, 2) array
+    return np.asarray(points, dtype=float) @ matrix[:, :2].T + matrix[:, 2]
+
+
+def invert(matrix):
+    linear = np.linalg.inv(matrix[:, :2])
+    return np.hstack((linear, -linear @ matrix[:, 2:]))
+
+
+def compose(outer, inner):
+    # outer(inner(p)) as a single matrix
+    return np.hstack((outer[:, :2] @ inner[:, :2], outer[:, :2] @ inner[:, 2:] + outer[:, 2:]))
+
+
 class Grid:
     def __init__(self, width, height, cell_size, header_height, font, screen):
         self.width = width
@@ -18,44 +33,100 @@ class Grid:
         self.font = font
         self.screen = screen
 
-    def draw_grid(self):
-        for x in range(0, self.width + 1, self.cell_size):
-            color = (0, 0, 0) if x == self.screen_center[0] else (220, 220, 220)
-            pygame.draw.line(self.screen, color, (x, self.header_height), (x, self.height + self.header_height))
+        # Affine world <-> screen transforms as 2x3 matrices, rebuilt only when the view changes
+        self.world_to_screen = None
+        self.screen_to_world = None
+        self.pixel_size = None  # world units per screen pixel
+        self.view_version = 0
+        self.update_transform()
+
+    def update_transform(self):
+        s = self.cell_size
+        cx, cy = self.screen_center
+        ox, oy = self.cartesian_center
+        self.world_to_screen = np.array(((s, 0, cx - s * ox),
+                                         (0, -s, cy + s * oy)), dtype=float)
+        self.screen_to_world = np.array(((1 / s, 0, ox - cx / s),
+                                         (0, -1 / s, oy + cy / s)), dtype=float)
+        self.pixel_size = 1 / s
+        self.view_version += 1
+
+    def set_view(self, cartesian_center=None, cell_size=None):
+        if cartesian_center is not None:
+            self.cartesian_center = np.array(cartesian_center)
+        if cell_size is not None:
+            self.cell_size = cell_size
+        self.cartesian_range = np.array(
+            (self.width / (self.cell_size * 2), (self.height + self.header_height) / (self.cell_size * 2)))
+        self.update_transform()
+
+    def to_screen(self, points):
+        # Works on a single (x, y) or on a whole (n, 2) array
+        return apply(self.world_to_screen, points)
+
+    def to_world(self, points):
+        return apply(self.screen_to_world, points)
+
+    def plane_area(self):
+        # left, top, right, bottom of the plane on screen
+        return 0, self.header_height, self.width, self.height + self.header_height
+
+    def visible_range(self):
+        # World coordinates of the bottom left and top right corners of the plane
+        left, top, right, bottom = self.plane_area()
+        corners = self.to_world(((left, bottom), (right, top)))
+        return corners[0], corners[1]
 
-        for y in range(self.header_height, self.header_height + self.height + 1, self.cell_size):
-            color = (0, 0, 0) if y == self.screen_center[1] else (220, 220, 220)
-            pygame.draw.line(self.screen, color, (0, y), (self.width, y))
+    def grid_lines(self, matrix=None, area=None):
+        """Integer world coordinates inside area, their position under matrix and the axes position."""
+        matrix = self.world_to_screen if matrix is None else matrix
+        left, top, right, bottom = self.plane_area() if area is None else area
+        (x_min, y_min), (x_max, y_max) = apply(invert(matrix), ((left, bottom), (right, top)))
+        xs = np.arange(np.ceil(x_min), np.floor(x_max) + 1)
+        ys = np.arange(np.ceil(y_min), np.floor(y_max) + 1)
+        screen_x = apply(matrix, np.stack((xs, np.zeros_like(xs)), axis=1))[:, 0]
+        screen_y = apply(matrix, np.stack((np.zeros_like(ys), ys), axis=1))[:, 1]
+        axis_x, axis_y = apply(matrix, (0, 0))
+        return xs, screen_x, ys, screen_y, axis_x, axis_y
 
-        for n, x in zip(np.arange(self.cartesian_range[0] * -1, self.cartesian_range[0]),
-                        range(0, self.width + 1, self.cell_size)):
+    def draw_grid(self, surface=None, matrix=None, area=None, font=None, scale=1):
+        # The defaults draw the live view, the export draws tiles with its own matrix and scale
+        surface = self.screen if surface is None else surface
+        font = self.font if font is None else font
+        left, top, right, bottom = self.plane_area() if area is None else area
+        xs, screen_x, ys, screen_y, axis_x, axis_y = self.grid_lines(matrix, (left, top, right, bottom))
+
+        for n, x in zip(xs, screen_x):
+            color = (0, 0, 0) if n == 0 else (220, 220, 220)
+            pygame.draw.line(surface, color, (x, top), (x, bottom), scale)
+
+        for n, y in zip(ys, screen_y):
+            color = (0, 0, 0) if n == 0 else (220, 220, 220)
+            pygame.draw.line(surface, color, (left, y), (right, y), scale)
+
+        for n, x in zip(xs, screen_x):
             if n % 5 == 0:
-                x_label = self.font.render(str(n), True, COLOR_DARK_GRAY)
-                self.screen.blit(x_label, (x + 2, self.screen_center[1] + 2))
-                pygame.draw.line(self.screen, COLOR_BLACK,
-                                 (x, self.screen_center[1] - 5),
-                                 (x, self.screen_center[1] + 5))
-
-        for n, y in zip(np.arange(self.cartesian_range[1] * -1, self.cartesian_range[1]),
-                        range(self.height + 1, self.header_height + 1, -1 * self.cell_size)):
-
-            if (n % 5 == 0) and (n != self.cartesian_range[1]) and (n != 0):
-                y_label = self.font.render(str(n), True, COLOR_DARK_GRAY)
-                self.screen.blit(y_label,
-                                 (self.screen_center[0] + 2, y + self.cell_size * 2 + 2))
-                pygame.draw.line(self.screen, COLOR_BLACK,
-                                 (self.screen_center[0] - 5, y + self.cell_size * 2),
-                                 (self.screen_center[0] + 5, y + self.cell_size * 2))
+                x_label = font.render(str(n), True, COLOR_DARK_GRAY)
+                surface.blit(x_label, (x + 2 * scale, axis_y + 2 * scale))
+                pygame.draw.line(surface, COLOR_BLACK,
+                                 (x, axis_y - 5 * scale),
+                                 (x, axis_y + 5 * scale), scale)
+
+        for n, y in zip(ys, screen_y):
+            if (n % 5 == 0) and (n != 0):
+                y_label = font.render(str(n), True, COLOR_DARK_GRAY)
+                surface.blit(y_label,
+                             (axis_x + 2 * scale, y + 2 * scale))
+                pygame.draw.line(surface, COLOR_BLACK,
+                                 (axis_x - 5 * scale, y),
+                                 (axis_x + 5 * scale, y), scale)
 
     def get_game_coordinates(self, cartesian_pos):
-        if type(cartesian_pos) is not np.array:
-            cartesian_pos = np.array(cartesian_pos)
-        if abs(cartesian_pos - self.cartesian_center) > self.cartesian_range:
+        cartesian_pos = np.asarray(cartesian_pos, dtype=float)
+        if np.any(np.abs(cartesian_pos - self.cartesian_center) > self.cartesian_range):
             print("coordinates out of range")
-        return ((cartesian_pos - self.cartesian_center) * self.cell_size).floor() + self.screen_center
+        return np.floor(self.to_screen(cartesian_pos))
 
     def get_cartesian_coordinates(self, mouse_pos):
-        grid_x = round((mouse_pos[0] / self.cell_size) - self.cartesian_range[0], 2)
-        grid_y = round(((self.height - mouse_pos[1] + self.header_height) / self.cell_size) - self.cartesian_range[1],
-                       2)
-        return grid_x, grid_y
+        grid_x, grid_y = self.to_world(mouse_pos)
+        return round(float(grid_x), 2), round(float(grid_y), 2)
@@ -3,7 +3,7 @@ import pygame
 
 from config import HEADER_SIZE, COLOR_BUTTON_PASIVE, COLOR_BUTTON_HOVERED, COLOR_BUTTON_ACTIVE, COLOR_BLACK, COLOR_WHITE
 
-from pygame_gui.elements import UIWindow, UITextEntryBox, UITextBox
+from pygame_gui.elements import UIWindow, UITextEntryBox, UITextBox, UITextEntryLine
 
 class Button:
     def __init__(self,
@@ -60,6 +60,8 @@ class Header:
                  buttons = {# Agregar boton de instrucciones
                      "line": (400, 2),
                      "point": (500,2),
+                     "function": (600,2),
+                     "polygon": (190,2),
                      "intro": (300,2)
                  }
                  ):
@@ -77,6 +79,8 @@ class Header:
         self.text_intro = None
         self.deploy_intro()
 
+        self.expression_window = None
+
 
     def deploy_intro(self):
         # Meter instrucciones
@@ -87,6 +91,27 @@ class Header:
             container=output_window)
 
 
+    def deploy_expression(self, expression):
+        # y = f(x) entry for a function graph, confirmed with enter
+        self.close_expression()
+        self.expression_window = UIWindow(pygame.Rect(250, 60, 300, 100), window_display_title="y =")
+        entry = UITextEntryLine(
+            relative_rect=pygame.Rect((0, 0), (self.expression_window.get_container().get_size()[0], 30)),
+            initial_text=expression,
+            container=self.expression_window)
+        entry.focus()
+
+    def expression_error(self, message):
+        self.expression_window.set_display_title(message)
+
+    def close_expression(self):
+        if self.is_typing():
+            self.expression_window.kill()
+        self.expression_window = None
+
+    def is_typing(self):
+        return self.expression_window is not None and self.expression_window.alive()
+
     def draw(self, text):
         pygame.draw.rect(self.screen, self.color, (0, 0, self.screen.get_width(), self.height))
         text_surf = self.font.render(text, True, COLOR_WHITE)
@@ -118,6 +143,6 @@ class Header:
         return out
 
     def is_mouse_inside(self, mouse_pos):# todo: return true si hay mensaje deployado
-        if self.text_intro.alive():
+        if self.text_intro.alive() or self.is_typing():
             return True
         return mouse_pos[1] < self.height
@@ -0,0 +1,143 @@
+"""
+Undo / redo as a journal of small commands instead of scene snapshots:
+
+    ("create", id, kind, data, index)
+    ("delete", id, kind, data, index)
+    ("move", id, before, after)       one per drag, geometry is (x, y, slope)
+
+Every HISTORY_CHECKPOINT commands the scene is saved, so jump_to can restore
+the closest checkpoint and replay a few commands instead of walking the whole
+journal. Only the last HISTORY_SIZE commands are kept.
+"""
+
+from collections import deque
+
+from config import HISTORY_SIZE, HISTORY_CHECKPOINT
+
+
+class History:
+    def __init__(self, plane, size=HISTORY_SIZE, checkpoint=HISTORY_CHECKPOINT):
+        self.plane = plane
+        self.size = size
+        self.checkpoint = checkpoint
+
+        self.commands = deque()
+        self.base = 0  # commands evicted so far, commands[0] is command number base
+        self.position = 0  # commands applied, undo goes back from here
+        self.checkpoints = {0: self.scene()}
+
+        self.moving = None  # (figure id, geometry before the drag)
+        self.replaying = False
+
+    def scene(self):
+        # Remote figures belong to the teacher's scene, not to this history
+        return [(f.id, f.kind, f.dump()) for f in self.plane.figures if not f.remote]
+
+    def record(self, command):
+        if self.replaying:
+            return
+        # A new command drops whatever could have been redone
+        for _ in range(self.base + len(self.commands) - self.position):
+            self.commands.pop()
+        self.checkpoints = {p: c for p, c in self.checkpoints.items() if p <= self.position}
+
+        self.commands.append(command)
+        self.position += 1
+        if len(self.commands) > self.size:
+            self.commands.popleft()
+            self.base += 1
+            self.checkpoints.pop(self.base - 1, None)
+        if self.position % self.checkpoint == 0:
+            self.checkpoints[self.position] = self.scene()
+
+    def on_new_figure(self, figure):
+        self.record(("create", figure.id, figure.kind, figure.dump(), len(self.plane.figures) - 1))
+
+    def on_move_figure(self, figure):
+        pass  # recorded once per drag by begin_move / end_move
+
+    def on_delete_figure(self, figure):
+        if self.replaying:
+            return
+        if self.moving and self.moving[0] == figure.id:
+            self.end_move()
+        self.record(("delete", figure.id, figure.kind, figure.dump(), self.plane.figures.index(figure)))
+
+    def begin_move(self, figure):
+        if self.moving and self.moving[0] != figure.id:
+            self.end_move()
+        if self.moving is None:
+            self.moving = (figure.id, tuple(figure.get_geometry()))
+
+    def end_move(self):
+        if self.moving is None:
+            return
+        id, before = self.moving
+        self.moving = None
+        figure = self.plane.figures_by_id.get(id)
+        if figure is not None:
+            after = tuple(figure.get_geometry())
+            if after != before:
+                self.record(("move", id, before, after))
+
+    def apply(self, command, undo):
+        self.replaying = True
+        kind = command[0]
+        figure = self.plane.figures_by_id.get(command[1])
+        if kind == "move":
+            _, id, before, after = command
+            if figure is not None:
+                self.plane.update_figure(figure, before if undo else after)
+        elif (kind == "create") == undo:
+            if figure is not None:
+                self.plane.delete_figure(figure)
+        else:
+            _, id, type, data, index = command
+            self.plane.restore_figure(id, type, data, index)
+        self.replaying = False
+
+    def can_undo(self):
+        return self.position > self.base
+
+    def can_redo(self):
+        return self.position < self.base + len(self.commands)
+
+    def undo(self):
+        self.end_move()
+        if self.can_undo():
+            self.position -= 1
+            self.apply(self.commands[self.position - self.base], undo=True)
+
+    def redo(self):
+        self.end_move()
+        if self.can_redo():
+            self.apply(self.commands[self.position - self.base], undo=False)
+            self.position += 1
+
+    def restore_checkpoint(self, position):
+        # Only touch the figures that differ from the checkpoint
+        self.replaying = True
+        scene = self.checkpoints[position]
+        ids = {id for id, _, _ in scene}
+        self.plane.delete_figures([f for f in self.plane.figures if f.id not in ids and not f.remote])
+        for id, type, data in scene:
+            figure = self.plane.figures_by_id.get(id)
+            if figure is None or figure.dump() != data:
+                self.plane.restore_figure(id, type, data)
+        self.plane.figures = [self.plane.figures_by_id[id] for id, _, _ in scene] + \
+                             [f for f in self.plane.figures if f.remote]
+        self.position = position
+        self.replaying = False
+
+    def jump_to(self, position):
+        self.end_move()
+        position = min(max(position, self.base), self.base + len(self.commands))
+        # Closest checkpoint at or before the target, if it saves steps
+        candidates = [p for p in self.checkpoints if self.base <= p <= position]
+        start = max(candidates, default=None)
+        if start is not None and position - start < abs(position - self.position):
+            self.restore_checkpoint(start)
+        while self.position < position:
+            self.redo()
+        while self.position > position:
+            self.undo()
@@ -0,0 +1,177 @@
+"""
+Live measurements as a dependency graph over figures.
+
+Each measurement reads figures (by id) or other measurements, a midpoint can
+be an end of a distance for example. The engine is a Cartesian_plane
+listener: when a figure moves, the measurements downstream of it are only
+marked dirty, and values are computed again the next time they are read.
+A drag then costs a walk over the measurements that depend on the dragged
+figure, however many there are in the scene, and nothing is computed unless
+it is shown.
+
+Deleted figures keep their measurements, which read as None until the figure
+comes back with the same id (undo).
+"""
+
+from collections import defaultdict, deque
+
+import numpy as np
+
+
+class Measurement:
+    name = "measurement"
+    attribute = "pos"  # what is read from input figures
+
+    def __init__(self, *inputs):
+        self.inputs = inputs  # figure ids or measurements
+        self.dirty = True
+        self.value = None
+
+    def compute(self, values):
+        raise NotImplementedError
+
+    def format(self, value):
+        return f"{value:.2f}"
+
+    def __str__(self):
+        value = self.value
+        return f"{self.name} {'-' if value is None else self.format(value)}"
+
+
+class Distance(Measurement):
+    name = "distance"
+
+    def compute(self, values):
+        a, b = values
+        return float(np.hypot(*(b - a)))
+
+
+class Midpoint(Measurement):
+    name = "midpoint"
+
+    def compute(self, values):
+        a, b = values
+        return (a + b) / 2
+
+    def format(self, value):
+        return f"({value[0]:.2f}, {value[1]:.2f})"
+
+
+class Angle(Measurement):
+    # Angle at the second input, between the first and the third
+    name = "angle"
+
+    def compute(self, values):
+        a, vertex, b = values
+        u, v = a - vertex, b - vertex
+        return float(np.degrees(abs(np.arctan2(u[0] * v[1] - u[1] * v[0], u @ v))))
+
+    def format(self, value):
+        return f"{value:.1f}°"
+
+
+class Slope(Measurement):
+    name = "slope"
+    attribute = "slope"
+
+    def compute(self, values):
+        return float(values[0])
+
+    def format(self, value):
+        return "vertical" if not np.isfinite(value) else f"{value:.2f}"
+
+
+class MeasurementEngine:
+    def __init__(self, plane):
+        self.plane = plane
+        self.measurements = []
+        self.dependents = defaultdict(list)  # figure id or measurement -> measurements reading it
+        self.recent = deque(maxlen=3)  # ids of the last selected figures, newest last
+
+    def add(self, measurement):
+        self.measurements.append(measurement)
+        for source in measurement.inputs:
+            self.dependents[source].append(measurement)
+        return measurement
+
+    def invalidate(self, source):
+        stack = list(self.dependents.get(source, ()))
+        while stack:
+            measurement = stack.pop()
+            if not measurement.dirty:
+                # Whatever is below a dirty measurement is already dirty
+                measurement.dirty = True
+                stack.extend(self.dependents.get(measurement, ()))
+
+    def on_new_figure(self, figure):
+        self.invalidate(figure.id)
+
+    def on_move_figure(self, figure):
+        self.invalidate(figure.id)
+
+    def on_delete_figure(self, figure):
+        self.invalidate(figure.id)
+        if figure.id in self.recent:
+            self.recent.remove(figure.id)
+
+    def input_value(self, source, measurement):
+        if isinstance(source, Measurement):
+            return self.value(source)
+        figure = self.plane.figures_by_id.get(source)
+        return None if figure is None else getattr(figure, measurement.attribute, None)
+
+    def value(self, measurement):
+        if measurement.dirty:
+            values = [self.input_value(source, measurement) for source in measurement.inputs]
+            measurement.value = None if any(v is None for v in values) else measurement.compute(values)
+            measurement.dirty = False
+        return measurement.value
+
+    def select(self, figure):
+        if figure.id in self.recent:
+            self.recent.remove(figure.id)
+        self.recent.append(figure.id)
+
+    def measure(self, name):
+        """Adds a measurement over the last selected figures, returns it or None if there are not enough."""
+        recent = list(self.recent)
+        if name == "slope":
+            figure = self.plane.figures_by_id.get(recent[-1]) if recent else None
+            return self.add(Slope(figure.id)) if figure is not None and figure.kind == "line" else None
+        if name == "angle":
+            return self.add(Angle(*recent)) if len(recent) == 3 else None
+        if len(recent) < 2:
+            return None
+        return self.add({"distance": Distance, "midpoint": Midpoint}[name](*recent[-2:]))
+
+    def text(self, figure):
+        """Values of the measurements that read figure directly."""
+        for measurement in self.dependents.get(figure.id, ()):
+            self.value(measurement)
+        return ", ".join(str(m) for m in self.dependents.get(figure.id, ()))
+
+
+if __name__ == "__main__":
+    import time
+    from types import SimpleNamespace
+
+    # A drag over a scene with many measurements, only the dragged point's ones are read
+    rng = np.random.default_rng(0)
+    figures = {id: SimpleNamespace(id=id, kind="point", pos=rng.uniform(-10, 10, 2)) for id in range(2000)}
+    engine = MeasurementEngine(SimpleNamespace(figures_by_id=figures))
+    for _ in range(20000):
+        a, b, c = (int(n) for n in rng.choice(2000, 3, replace=False))
+        engine.add(Distance(a, b))
+        engine.add(Distance(engine.add(Midpoint(a, b)), c))
+        engine.add(Angle(a, b, c))
+    for measurement in engine.measurements:
+        engine.value(measurement)
+
+    dragged = figures[0]
+    start = time.perf_counter()
+    for step in range(1000):
+        dragged.pos = dragged.pos + 0.01
+        engine.on_move_figure(dragged)
+        engine.text(dragged)
+    print(f"{len(engine.measurements)} measurements, "
+          f"{(time.perf_counter() - start) * 1000:.3f} us per drag sample")
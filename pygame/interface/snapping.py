@@ -0,0 +1,114 @@
+"""
+Magnetic snapping for dragged figures.
+
+Snap targets (points, rectangle corners, the first vertex of polygons and
+line intersections) are kept in a uniform spatial hash of SNAP_BUCKET sized
+cells, so a drag sample only looks at the few cells around the mouse instead
+of every target in the scene. The engine is a Cartesian_plane listener: when
+a figure changes, only the targets it owns are replaced. Lattice points are
+computed on the fly.
+"""
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from config import SNAP_BUCKET, SNAP_LATTICE
+
+
+class SnapEngine:
+    def __init__(self, bucket=SNAP_BUCKET, lattice=SNAP_LATTICE, limit=1e4):
+        self.bucket = bucket
+        self.lattice = lattice
+        self.limit = limit  # intersections farther than this are ignored
+
+        self.targets = {}  # key -> (pos, cell)
+        self.cells = defaultdict(dict)  # cell -> {key: pos}
+        self.owned = defaultdict(set)  # figure id -> keys of its targets
+        self.line_ids = []
+        self.line_origins = np.empty((0, 2))
+        self.line_directions = np.empty((0, 2))
+
+    def cell(self, pos):
+        return math.floor(pos[0] / self.bucket), math.floor(pos[1] / self.bucket)
+
+    def add(self, key, pos, owners):
+        cell = self.cell(pos)
+        self.targets[key] = (pos, cell)
+        self.cells[cell][key] = pos
+        for owner in owners:
+            self.owned[owner].add(key)
+
+    def remove_figure(self, id):
+        for key in self.owned.pop(id, ()):
+            if key not in self.targets:
+                continue
+            _, cell = self.targets.pop(key)
+            del self.cells[cell][key]
+            if not self.cells[cell]:
+                del self.cells[cell]
+            for owner in key[1:]:
+                if owner != id:
+                    self.owned[owner].discard(key)
+
+        if id in self.line_ids:
+            n = self.line_ids.index(id)
+            del self.line_ids[n]
+            self.line_origins = np.delete(self.line_origins, n, axis=0)
+            self.line_directions = np.delete(self.line_directions, n, axis=0)
+
+    def update_figure(self, figure):
+        self.remove_figure(figure.id)
+        if figure.kind == "point":
+            self.add(("point", figure.id), tuple(figure.pos.tolist()), (figure.id,))
+        elif figure.kind in ("figure", "polygon"):
+            self.add(("corner", figure.id), tuple(figure.pos.tolist()), (figure.id,))
+        elif figure.kind == "line":
+            self.add_intersections(figure)
+            self.line_ids.append(figure.id)
+            self.line_origins = np.vstack((self.line_origins, figure.pos))
+            self.line_directions = np.vstack((self.line_directions, figure.direction))
+
+    def add_intersections(self, line):
+        # Solve pos + t * d = p_i + s * d_i against every other line at once
+        d = line.direction
+        cross = self.line_directions[:, 0] * d[1] - self.line_directions[:, 1] * d[0]
+        crossing = np.flatnonzero(np.abs(cross) > 1e-9)  # parallel lines never meet
+        offset = line.pos - self.line_origins[crossing]
+        s = (offset[:, 0] * d[1] - offset[:, 1] * d[0]) / cross[crossing]
+        points = self.line_origins[crossing] + s[:, np.newaxis] * self.line_directions[crossing]
+        valid = np.all(np.abs(points) < self.limit, axis=1)
+        for n, point in zip(crossing[valid], points[valid]):
+            other = self.line_ids[n]
+            key = ("cross", min(line.id, other), max(line.id, other))
+            self.add(key, tuple(point.tolist()), (line.id, other))
+
+    def on_new_figure(self, figure):
+        self.update_figure(figure)
+
+    def on_move_figure(self, figure):
+        self.update_figure(figure)
+
+    def on_delete_figure(self, figure):
+        self.remove_figure(figure.id)
+
+    def snap(self, pos, radius, exclude=None):
+        """Returns the closest target within radius of pos, or pos itself."""
+        best, best_distance = pos, radius
+        if self.lattice:
+            lattice = np.round(pos)
+            distance = np.hypot(*(lattice - pos))
+            if distance <= best_distance:
+                best, best_distance = lattice, distance
+
+        excluded = self.owned.get(exclude, ())
+        x, y = float(pos[0]), float(pos[1])
+        (x0, y0), (x1, y1) = self.cell((x - radius, y - radius)), self.cell((x + radius, y + radius))
+        for i in range(x0, x1 + 1):
+            for j in range(y0, y1 + 1):
+                for key, target in self.cells.get((i, j), {}).items():
+                    distance = math.hypot(target[0] - x, target[1] - y)
+                    if distance <= best_distance and key not in excluded:
+                        best, best_distance = np.array(target), distance
+        return best
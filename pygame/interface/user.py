@@ -1,5 +1,5 @@
 import pygame
-from pygame_gui import UI_TEXT_ENTRY_CHANGED
+from pygame_gui import UI_TEXT_ENTRY_FINISHED
 
 class User:
     def __init__(self, manager):
@@ -10,16 +10,18 @@ class User:
         self.mouse_motion = False
         self.mouse_rel = (0, 0)  # Relative mouse movement
         self.mouse_buttons = [0, 0, 0]  # Left, Middle, Right
+        self.text_entered = None  # text confirmed with enter in a text entry this frame
 
     def process_events(self):
+        self.text_entered = None
         # Go through all the events
         for event in pygame.event.get():
 
             if event.type == pygame.QUIT:
                 self.handle_quit()
                 return False
-            if event.type == UI_TEXT_ENTRY_CHANGED:
-                print("to_be_implemented")
+            if event.type == UI_TEXT_ENTRY_FINISHED:
+                self.text_entered = event.text
             elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
                 self.handle_key_event(event)
             elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app imports its modules from the pygame folder (from config import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
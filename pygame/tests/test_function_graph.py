@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from interface.figures import FunctionGraph, FUNCTION_NAMESPACE, compile_expression
+from interface.grid import Grid
+
+
+@pytest.fixture
+def grid():
+    return Grid(800, 560, 20, 40, None, None)
+
+
+def curve_segments(graph):
+    graph.update_polyline()
+    return list(graph.segments(np.concatenate(([graph.pos], graph.polyline))))
+
+
+@pytest.mark.parametrize("slope", [45, 50, 500])
+def test_steep_line_is_one_segment_at_its_slope(grid, slope):
+    (_, y_min), (_, y_max) = grid.visible_range()
+    graph = FunctionGraph((0, 0), None, grid, f"{slope} * x")
+
+    segments = curve_segments(graph)
+    assert len(segments) == 1
+    segment = segments[0]
+    assert segment[0][1] <= y_min and segment[-1][1] >= y_max
+    assert np.allclose(np.diff(segment[:, 1]) / np.diff(segment[:, 0]), slope)
+    assert graph.check_hover((1 / slope, 1), grid.pixel_size)
+
+
+def test_steep_sine_hovers_where_visible(grid):
+    graph = FunctionGraph((0, 0), None, grid, "100 * sin(x)")
+    assert graph.check_hover((0.1, 100 * np.sin(0.1)), grid.pixel_size)
+
+
+@pytest.mark.parametrize("expression", ["tan(x)", "1 / x"])
+def test_discontinuities_are_split(grid, expression):
+    (_, y_min), (_, y_max) = grid.visible_range()
+    graph = FunctionGraph((0, 0), None, grid, expression)
+
+    segments = curve_segments(graph)
+    assert len(segments) > 1
+    for segment in segments:
+        assert np.all(np.abs(np.diff(segment[:, 1])) < 2 * (y_max - y_min))
+
+
+@pytest.mark.parametrize("expression", ["__import__('os')", "().__class__", "np.zeros(3)", "'x'", "sin(x, x, x)",
+                                        "sin(x"])
+def test_invalid_expressions_are_rejected(grid, expression):
+    graph = FunctionGraph((0, 0), None, grid)
+    with pytest.raises(ValueError):
+        graph.set_expression(expression)
+    assert graph.expression == "sin(x)"
+
+
+def test_namespace_is_not_modified():
+    compile_expression("sqrt(abs(x)) + pi")
+    assert "__builtins__" not in FUNCTION_NAMESPACE
+    assert "np" not in FUNCTION_NAMESPACE